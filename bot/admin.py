@@ -1,8 +1,7 @@
-import csv, json
-from datetime import datetime
-from pathlib import Path
+import re
 
 from telegram import InlineKeyboardMarkup, Update
+from telegram.error import BadRequest
 from telegram.ext import (
     CallbackQueryHandler,
     CommandHandler,
@@ -12,9 +11,28 @@ from telegram.ext import (
     filters,
 )
 
-from database.db_setup import session, and_, or_
-from database.models import User, Attendance
-from config import ADMINS
+from sqlalchemy import func, select
+
+from database.cache import user_cache
+from database.db_setup import session_scope
+from database.models import Attendance, User
+from .analytics import format_report, get_report
+from .broadcast import (
+    broadcaster,
+    cancel_broadcast,
+    create_broadcast,
+    get_progress_keyboard,
+    get_text_progress
+)
+from .captcha import captcha_pool
+from .export import count_rows, send_export
+from .marking import expand_days, mark_attendance
+from .proofs import proof_queue
+from .ratelimit import attendance_flows, rate_limiter
+from .state import captchas, challenges, state_backend
+from .storage import resolve
+from .throttle import buckets, throttled
+from config import ADMINS, EXPORT_BUNDLE
 
 
 class AdminsFilter(filters.UpdateFilter):
@@ -26,22 +44,32 @@ ADMINS_FILTER = AdminsFilter()
 
 WAIT, SET_DAY, SET_LECTURE, SET_USER, SET_SUBGROUP = range(5)
 GET_VIDEO, GET_MESSAGE, ACCEPT_PING = range(3)
+MARK_USERS, MARK_DAYS, MARK_LECTURES = range(3)
+
+
+def parse_days(user_input: str) -> list[list[str]]:
+    return [date.strip().split('-') for date in user_input.split(',')]
 
 
-UPLOAD_SETTINGS = {
-    'days': None,
-    'lectures': None,
-    'users': None,
-    'subgroup': None
-}
+def parse_lectures(user_input: str) -> list[str]:
+    all_lectures = []
+    
+    for lectures in user_input.split(','):
+        lectures = list(map(int, lectures.split('-')))
+        if len(lectures) == 1:
+            all_lectures.append(str(lectures[0]))
+        if len(lectures) == 2:
+            all_lectures.extend(list(map(str, (range(lectures[0], lectures[1]+1)))))
+    
+    return all_lectures
 
 
-CURRENT_MSG = {}
+def parse_users(user_input: str) -> list[str]:
+    return [' '.join(full_name.split()) for full_name in re.split(r'[,\n]', user_input) if full_name.strip()]
 
 
-def wipe_upload_settings() -> None:
-    global UPLOAD_SETTINGS
-    UPLOAD_SETTINGS = {
+def new_upload_settings() -> dict:
+    return {
         'days': None,
         'lectures': None,
         'users': None,
@@ -49,152 +77,52 @@ def wipe_upload_settings() -> None:
     }
 
 
-def get_upload_rows() -> list | str:
-    try:
-        query = session.query(Attendance).join(User)
-        
-        if UPLOAD_SETTINGS['days']:
-            day_filters = []
-            
-            for day_group in UPLOAD_SETTINGS['days']:
-                day_start = datetime.strptime(day_group[0].strip(), "%d.%m.%Y")
-                day_end = day_start
-                
-                if len(day_group) == 2:
-                    day_end = datetime.strptime(day_group[1].strip(), "%d.%m.%Y")
-                    
-                day_end = day_end.replace(hour=23, minute=59, second=59)
-                day_filters.append(Attendance.timestamp.between(day_start, day_end))
-                
-            query = query.filter(or_(*day_filters))
-        
-        if UPLOAD_SETTINGS['lectures']:
-            query = query.filter(Attendance.lecture_number.in_(UPLOAD_SETTINGS['lectures']))
-        
-        if UPLOAD_SETTINGS['users']:
-            user_filters = []
-            
-            for user_full_name in UPLOAD_SETTINGS['users']:
-                last_name, first_name, middle_name = user_full_name.split()
-                user_filters.append(and_(
-                    User.last_name == last_name,
-                    User.first_name == first_name,
-                    User.middle_name == middle_name
-                ))
-                
-            query = query.filter(or_(*user_filters))
-        
-        if UPLOAD_SETTINGS['subgroup']:
-            query = query.filter(User.subgroup == UPLOAD_SETTINGS['subgroup'])
-            
-            
-        return query.order_by(Attendance.timestamp).all()
-    
-    except Exception as e:
-        return repr(e)
-
-
-def create_simpe_csv_from_rows(rows: list[Attendance]) -> Path:
-    date_range = list(set(map(lambda x: x.timestamp.strftime("%d.%m.%Y"), rows)))
-    
-    header = ['Дата']
-    subheader = ['Пара']
-    
-    for date in date_range:
-        header += [date]
-        header += [' ' for _ in range(7)]
-        
-        subheader += [str(i) for i in range(1, 9)]
-    
-    full_names = set(map(lambda x: f'{x.user.last_name} {x.user.first_name} {x.user.middle_name}', rows))
-    full_names = sorted(full_names)
-    
-    csv_row = {user: ['' for _ in range(len(date_range) * 8)] for user in full_names}
-    
-    for row in rows:
-        csv_row[f'{row.user.last_name} {row.user.first_name} {row.user.middle_name}'] \
-        [date_range.index(row.timestamp.strftime("%d.%m.%Y")) * 8 + row.lecture_number - 1] = 1
-    
-    path = Path.cwd() / 'data' / 'simpe_attendance.csv'
-
-    with open(path, 'w', newline='', encoding='utf-8-sig') as csvfile:
-        writer = csv.writer(csvfile, delimiter=";")
-        
-        writer.writerow(header)
-        writer.writerow(subheader)
-        
-        for full_name in full_names:
-            writer.writerow([full_name] + csv_row[full_name])
-            
-    return path
-
+def get_upload_settings(context: ContextTypes.DEFAULT_TYPE) -> dict:
+    return context.user_data.setdefault('upload_settings', new_upload_settings())
 
-def create_extended_csv_from_rows(rows: list[Attendance]) -> Path:
-    path = Path.cwd() / 'data' / 'extended_attendance.csv'
 
-    with open(path, 'w', newline='', encoding='utf-8-sig') as csvfile:
-        writer = csv.writer(csvfile, delimiter=";")
-        writer.writerow(['ID Отметки', 'Telegram ID', 'ФИО', 'Подгруппа', 'Дата', 'Время','Пара', 'Задание', 'Подтверждение'])
-        
-        for row in rows:
-            full_name = f'{row.user.last_name} {row.user.first_name} {row.user.middle_name}'
-            user = [row.id, row.user.telegram_id, full_name, row.user.subgroup]
-            pare = [row.timestamp.strftime("%d.%m.%Y"), row.timestamp.strftime("%H:%M:%S"), row.lecture_number, row.challenge, row.video_path] 
-
-            writer.writerow(user + pare)
-
-    return path
+def wipe_upload_settings(context: ContextTypes.DEFAULT_TYPE) -> None:
+    context.user_data['upload_settings'] = new_upload_settings()
 
 
-def create_json_from_rows(rows) -> Path:
-    path = Path.cwd() / 'data' / 'extended_attendance.json'
-
-    with open(path, 'w', encoding='utf-8') as jsonfile:
-        to_write = {}
-        keys = ['Telegram ID', 'ФИО', 'Подгруппа', 'Дата', 'Время', 'Пара', 'Задание', 'Подтверждение']
-        
-        for row in rows:
-            full_name = f'{row.user.last_name} {row.user.first_name} {row.user.middle_name}'
-            user = [row.user.telegram_id, full_name, row.user.subgroup]
-            pare = [row.timestamp.strftime("%d.%m.%Y"), row.timestamp.strftime("%H:%M:%S"), row.lecture_number, row.challenge, row.video_path] 
-
-            to_write[row.id] = dict(zip(keys, user + pare))
-        
-        json.dump(to_write, jsonfile, indent=4, ensure_ascii=False)
-
-    return path
+async def get_upload_count(settings: dict) -> int | str:
+    try:
+        return await count_rows(settings)
+    
+    except Exception as e:
+        return repr(e)
 
 
-def get_text_upload_attendance() -> str:
+async def get_text_upload_attendance(settings: dict) -> str:
     text = f'📥 Настройки выгрузки\n\n'
     
-    if UPLOAD_SETTINGS['days']:
-        text += f'🌞 Дни: {", ".join(["-".join(day) for day in UPLOAD_SETTINGS["days"]])}\n'
+    if settings['days']:
+        text += f'🌞 Дни: {", ".join(["-".join(day) for day in settings["days"]])}\n'
     else:
         text += '🌞 Дни: все доступные\n'
         
-    if UPLOAD_SETTINGS['lectures']:
-        text += f'💬 Пары: {", ".join(UPLOAD_SETTINGS["lectures"])}\n'
+    if settings['lectures']:
+        text += f'💬 Пары: {", ".join(settings["lectures"])}\n'
     else:
         text += '💬 Пары: все доступные\n'
         
-    if UPLOAD_SETTINGS['users']:
-        text += f'🎓 Люди: {", ".join(UPLOAD_SETTINGS["users"])}\n'
+    if settings['users']:
+        text += f'🎓 Люди: {", ".join(settings["users"])}\n'
     else:
         text += '🎓 Люди: все доступные\n'
-    if UPLOAD_SETTINGS['subgroup']:
-        text += f'💼 Подгруппа: {UPLOAD_SETTINGS["subgroup"]}\n\n'
+    if settings['subgroup']:
+        text += f'💼 Подгруппа: {settings["subgroup"]}\n\n'
     else:
         text += '💼 Подгруппа: обе\n\n'
     
     text += '‼️ Перед выгрузкой проверь настройки ‼️\n'
     
-    rows = get_upload_rows()
+    count = await get_upload_count(settings)
 
-    if isinstance(rows, str):
-        text += f'❌ ОШИБКА: {rows[:100]}... ❌'
+    if isinstance(count, str):
+        text += f'❌ ОШИБКА: {count[:100]}... ❌'
     else:
-        text += f'🔎 Найдено {len(rows)} записей'
+        text += f'🔎 Найдено {count} записей'
         
     return text
 
@@ -220,8 +148,8 @@ def get_admin_keyboard() -> InlineKeyboardMarkup:
         [
             [{'text': '📥 Выгрузить посещаемость', 'callback_data': 'first_upload_attendance'}],
             [{'text': '📸 Выгрузить видео-кружок', 'callback_data': 'upload_video'}],
-            [{'text': '📢 Запустить рассылку [TODO]', 'callback_data': 'start_ping'}],
-            [{'text': '🖊️ Отметить вручную [TODO]', 'callback_data': 'start_ping'}]
+            [{'text': '📢 Запустить рассылку', 'callback_data': 'start_ping'}],
+            [{'text': '🖊️ Отметить вручную', 'callback_data': 'manual_mark'}]
         ]
     )
 
@@ -233,6 +161,7 @@ def get_upload_keyboard() -> InlineKeyboardMarkup:
             [{'text': '💬 Выбрать пары', 'callback_data': 'set_lectures'}],
             [{'text': '🎓 Выбрать людей', 'callback_data': 'set_users'}],
             [{'text': '💼 Выбрать подгруппу', 'callback_data': 'set_subgroup'}],
+            [{'text': '📊 Статистика', 'callback_data': 'show_analytics'}],
             [
                 {'text': 'Отмена', 'callback_data': 'cancel'},
                 {'text': 'Выгрузить', 'callback_data': 'start_upload_attendance'}
@@ -241,6 +170,7 @@ def get_upload_keyboard() -> InlineKeyboardMarkup:
     )
 
 
+@throttled('admin')
 async def admin(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user = update.message.from_user
     await update.message.delete()
@@ -253,32 +183,74 @@ async def admin(update: Update, context: ContextTypes.DEFAULT_TYPE):
     return ConversationHandler.END
 
 
+async def get_text_stats() -> str:
+    cache = user_cache.stats()
+    throttled_text = ', '.join(
+        f'{group} {bucket.throttled}/{bucket.allowed + bucket.throttled}' for group, bucket in buckets.items()
+    )
+
+    return (
+        '📊 Статистика\n\n'
+        f'👥 Кэш пользователей: {cache["size"]}/{cache["max_size"]}\n'
+        f'🎯 Попадания: {cache["hits"]}, промахи: {cache["misses"]} '
+        f'({cache["hit_rate"]:.0%})\n'
+        f'🤖 Готовых капч: {captcha_pool.ready}/{captcha_pool.size}\n'
+        f'📼 Видео в очереди загрузки: {proof_queue.queue.qsize()}\n'
+        f'✍️ Незавершённых отметок: {await captchas.count() + await challenges.count()} '
+        f'(сброшено: {captchas.expired + challenges.expired + state_backend.evicted})\n'
+        f'📡 API-вызовов на отметку: {attendance_flows.average("marked"):.1f} '
+        f'(отметок: {attendance_flows.flows["marked"]}, '
+        f'отмен и ошибок: {attendance_flows.flows["failed"] + attendance_flows.flows["cancelled"]})\n'
+        f'📨 Всего API-вызовов: {rate_limiter.endpoints.total()}\n'
+        f'⏳ Ограничено запросов: {throttled_text}'
+    )
+
+
+@throttled('admin')
+async def stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    await update.message.delete()
+    await update.message.reply_text(await get_text_stats())
+
+
 async def upload_video(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    user_id = update.callback_query.from_user.id
     query = update.callback_query
     await query.answer()
     
-    CURRENT_MSG[user_id] = await query.edit_message_text(
+    message = await query.edit_message_text(
         '📸 Введите название видео из базы\n'
         'Например: `867536228_16082024_112838.mp4`',
         reply_markup=get_cancel_keyboard(),
         parse_mode='Markdown'
     )
+    context.user_data['video_message_id'] = message.message_id
     
     return GET_VIDEO
 
 
 async def get_video(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    user_id = update.message.from_user.id
+    video_name = update.message.text.strip()
     await update.message.delete()
-    video_path = Path.cwd() / 'data' / 'proofs' / update.message.text
-    
+
     await context.bot.delete_message(
             chat_id=update.message.chat_id,
-            message_id=CURRENT_MSG[user_id].message_id
+            message_id=context.user_data.pop('video_message_id')
         )
-    
-    if not video_path.exists():
+
+    async with session_scope() as session:
+        file_id = await session.scalar(
+            select(Attendance.file_id).where(Attendance.video_path == video_name)
+        )
+
+    if file_id is not None:
+        try:
+            await update.message.reply_video_note(file_id)
+            return ConversationHandler.END
+        except BadRequest:
+            pass
+
+    video_path = await resolve(video_name)
+
+    if video_path is None:
         await update.message.reply_text('❌ Видео не найдено')
     else:
         await update.message.reply_video(video_path)
@@ -286,15 +258,16 @@ async def get_video(update: Update, context: ContextTypes.DEFAULT_TYPE):
     return ConversationHandler.END
 
 
+@throttled('admin')
 async def upload_attendance(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     await query.answer()
     
     if query.data == 'first_upload_attendance':
-        wipe_upload_settings()
+        wipe_upload_settings(context)
     
     await query.edit_message_text(
-        text=get_text_upload_attendance(),
+        text=await get_text_upload_attendance(get_upload_settings(context)),
         reply_markup=get_upload_keyboard()
     )
     
@@ -316,7 +289,7 @@ async def set_days(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 async def get_days(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_input = update.message.text
-    UPLOAD_SETTINGS['days'] = [date.strip().split('-') for date in user_input.split(',')]
+    get_upload_settings(context)['days'] = parse_days(user_input)
 
     await update.message.delete()
     await update.message.reply_text(
@@ -340,16 +313,7 @@ async def set_lectures(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 async def get_lectures(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_input = update.message.text
-    all_lectures = []
-    
-    for lectures in user_input.split(','):
-        lectures = list(map(int, lectures.split('-')))
-        if len(lectures) == 1:
-            all_lectures.append(str(lectures[0]))
-        if len(lectures) == 2:
-            all_lectures.extend(list(map(str, (range(lectures[0], lectures[1]+1)))))
-        
-    UPLOAD_SETTINGS['lectures'] = all_lectures
+    get_upload_settings(context)['lectures'] = parse_lectures(user_input)
 
     await update.message.delete()
     await update.message.reply_text(
@@ -373,7 +337,7 @@ async def set_users(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 async def get_users(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_input = update.message.text
-    UPLOAD_SETTINGS['users'] = [full_name for full_name in user_input.split(',')]
+    get_upload_settings(context)['users'] = parse_users(user_input)
 
     await update.message.delete()
     await update.message.reply_text(
@@ -396,7 +360,7 @@ async def set_subgroup(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 
 async def get_subgroup(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    UPLOAD_SETTINGS['subgroup'] = int(update.message.text)
+    get_upload_settings(context)['subgroup'] = int(update.message.text)
 
     await update.message.delete()
     await update.message.reply_text(
@@ -405,44 +369,217 @@ async def get_subgroup(update: Update, context: ContextTypes.DEFAULT_TYPE):
     )
 
 
+@throttled('admin')
 async def start_upload_attendance(update: Update, context: ContextTypes.DEFAULT_TYPE):
     callback_query = update.callback_query
-    rows = get_upload_rows()
+    settings = get_upload_settings(context)
+    count = await get_upload_count(settings)
     
-    if isinstance(rows, str):
+    if isinstance(count, str):
         text = f'Ну ты даун? Ошибка же!'
         await callback_query.answer(text)
-        await upload_attendance(update, context)
+        return WAIT
 
 
-    text = f'Выгружаю {len(rows)} записей'
+    text = f'Выгружаю {count} записей'
     await callback_query.answer(text)
     
     await callback_query.delete_message()
+
+    await send_export(context.bot, update.effective_chat.id, settings, EXPORT_BUNDLE)
+
+    return ConversationHandler.END
+
+
+@throttled('admin')
+async def show_analytics(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    callback_query = update.callback_query
+    settings = get_upload_settings(context)
+    count = await get_upload_count(settings)
+
+    if isinstance(count, str):
+        await callback_query.answer('Ну ты даун? Ошибка же!')
+        return WAIT
+
+    await callback_query.answer('Считаю статистику')
+
+    await callback_query.edit_message_text(
+        text=format_report(await get_report(settings)),
+        reply_markup=get_return_keyboard()
+    )
+
+    return WAIT
+
+
+async def get_ping_keyboard() -> InlineKeyboardMarkup:
+    async with session_scope() as session:
+        subgroups = (await session.execute(
+            select(User.subgroup, func.count()).group_by(User.subgroup).order_by(User.subgroup)
+        )).all()
+
+    keyboard = [[{'text': f'📢 Всем ({sum(count for _, count in subgroups)})', 'callback_data': 'accept_ping:0'}]]
+
+    for subgroup, count in subgroups:
+        if subgroup:
+            keyboard.append([{'text': f'💼 {subgroup} подгруппе ({count})', 'callback_data': f'accept_ping:{subgroup}'}])
+
+    keyboard.append([{'text': 'Отмена', 'callback_data': 'cancel'}])
+    return InlineKeyboardMarkup(keyboard)
+
+
+async def start_ping(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+
+    if query.from_user.id not in ADMINS:
+        await query.answer()
+        return ConversationHandler.END
+
+    await query.answer()
     
-    path = create_simpe_csv_from_rows(rows)
-    await context.bot.send_document(
-        chat_id=update.effective_chat.id,
-        document=path
+    message = await query.edit_message_text(
+        '📢 Отправь сообщение для рассылки\n'
+        'Подойдёт текст, фото, видео или файл',
+        reply_markup=get_cancel_keyboard()
     )
+    context.user_data['ping_prompt_id'] = message.message_id
     
-    path = create_extended_csv_from_rows(rows)
-    await context.bot.send_document(
-        chat_id=update.effective_chat.id,
-        document=path
+    return GET_MESSAGE
+
+
+async def get_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    context.user_data['ping_message_id'] = update.message.message_id
+
+    await context.bot.delete_message(
+            chat_id=update.message.chat_id,
+            message_id=context.user_data.pop('ping_prompt_id')
+        )
+
+    await update.message.reply_text(
+        '📢 Кому отправить это сообщение?',
+        reply_markup=await get_ping_keyboard()
     )
     
-    path = create_json_from_rows(rows)
-    await context.bot.send_document(
-        chat_id=update.effective_chat.id,
-        document=path
+    return ACCEPT_PING
+
+
+async def accept_ping(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+
+    if query.from_user.id not in ADMINS:
+        await query.answer()
+        return ConversationHandler.END
+
+    await query.answer('Рассылка запущена')
+
+    broadcast = await create_broadcast(
+        chat_id=query.message.chat_id,
+        message_id=context.user_data.pop('ping_message_id'),
+        progress_message_id=query.message.message_id,
+        subgroup=int(query.data.split(':')[1]) or None
     )
 
+    await query.edit_message_text(
+        get_text_progress(broadcast),
+        reply_markup=get_progress_keyboard(broadcast)
+    )
+    broadcaster.put(broadcast.id)
+    
+    return ConversationHandler.END
+
+
+async def stop_ping(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+
+    if query.from_user.id not in ADMINS:
+        await query.answer()
+        return
+
+    await cancel_broadcast(int(query.data.split(':')[1]))
+    await query.answer('Останавливаю рассылку')
+
+
+async def manual_mark(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+
+    if query.from_user.id not in ADMINS:
+        await query.answer()
+        return ConversationHandler.END
+
+    await query.answer()
+    
+    await query.edit_message_text(
+        "🖊️ Вставь список людей для отметки\n"
+        "Через запятую или каждого с новой строки:\n"
+        "Иванов Иван Иванович, Петров Петр Петрович",
+        reply_markup=get_cancel_keyboard()
+    )
+    context.user_data['manual_mark'] = {}
+    
+    return MARK_USERS
+
+
+async def get_mark_users(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    context.user_data['manual_mark']['users'] = parse_users(update.message.text)
+
+    await update.message.reply_text(
+        "🌞 Укажи промежутки дней в формате\n"
+        "дд.мм.гггг-дд.мм.гггг, дд.мм.гггг-дд.мм.гггг...",
+        reply_markup=get_cancel_keyboard()
+    )
+    
+    return MARK_DAYS
+
+
+async def get_mark_days(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    try:
+        days = parse_days(update.message.text)
+        expand_days(days)
+    except ValueError:
+        await update.message.reply_text('📛 Неверный формат дат, попробуй ещё раз')
+        return MARK_DAYS
+
+    context.user_data['manual_mark']['days'] = days
+
+    await update.message.reply_text(
+        "💬 Укажи нужные пары в формате\n"
+        "1-4, 7, 8-10",
+        reply_markup=get_cancel_keyboard()
+    )
+    
+    return MARK_LECTURES
+
+
+async def get_mark_lectures(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    try:
+        lectures = parse_lectures(update.message.text)
+    except ValueError:
+        await update.message.reply_text('📛 Неверный формат пар, попробуй ещё раз')
+        return MARK_LECTURES
+
+    settings = context.user_data.pop('manual_mark')
+    result = await mark_attendance(
+        settings['users'],
+        expand_days(settings['days']),
+        sorted({int(lecture) for lecture in lectures})
+    )
+
+    text = (
+        '🖊️ Ручная отметка\n\n'
+        f'🎓 Найдено людей: {result.users}\n'
+        f'👌 Поставлено отметок: {result.inserted}\n'
+        f'🔁 Уже были отмечены: {result.skipped}\n'
+    )
+
+    if result.invalid:
+        text += f'💤 Пар нет в расписании: {result.invalid}\n'
+
+    if result.missing:
+        text += f'\n❌ Не найдены: {", ".join(result.missing)}\n'
+
+    await update.message.reply_text(text[:4096])
+    
     return ConversationHandler.END
 
-# TODO
-# Ручную отметку
-# Пинг всем юзерамo
 
 async def cancel(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
@@ -454,6 +591,7 @@ async def cancel(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 def handlers() -> list:
     admin_panel_handler = CommandHandler('admin', admin, filters=ADMINS_FILTER)
+    stats_handler = CommandHandler('stats', stats, filters=ADMINS_FILTER)
     
     upload_video_handler = ConversationHandler(
         entry_points=[
@@ -464,9 +602,48 @@ def handlers() -> list:
                 MessageHandler(filters.TEXT & ~filters.COMMAND, get_video)
             ]
         },
-        fallbacks=[CallbackQueryHandler(cancel, pattern='^cancel$'),]
+        fallbacks=[CallbackQueryHandler(cancel, pattern='^cancel$'),],
+        name='upload_video',
+        persistent=True
     )
     
+    ping_handler = ConversationHandler(
+        entry_points=[
+            CallbackQueryHandler(start_ping, pattern="^start_ping$")
+        ],
+        states={
+            GET_MESSAGE: [
+                MessageHandler(~filters.COMMAND, get_message)
+            ],
+            ACCEPT_PING: [
+                CallbackQueryHandler(accept_ping, pattern=r"^accept_ping:\d+$")
+            ]
+        },
+        fallbacks=[CallbackQueryHandler(cancel, pattern='^cancel$'),],
+        name='ping',
+        persistent=True
+    )
+    manual_mark_handler = ConversationHandler(
+        entry_points=[
+            CallbackQueryHandler(manual_mark, pattern="^manual_mark$")
+        ],
+        states={
+            MARK_USERS: [
+                MessageHandler(filters.TEXT & ~filters.COMMAND, get_mark_users)
+            ],
+            MARK_DAYS: [
+                MessageHandler(filters.TEXT & ~filters.COMMAND, get_mark_days)
+            ],
+            MARK_LECTURES: [
+                MessageHandler(filters.TEXT & ~filters.COMMAND, get_mark_lectures)
+            ]
+        },
+        fallbacks=[CallbackQueryHandler(cancel, pattern='^cancel$'),],
+        name='manual_mark',
+        persistent=True
+    )
+    stop_ping_handler = CallbackQueryHandler(stop_ping, pattern=r"^stop_ping:\d+$")
+    
     upload_attendance_handler = ConversationHandler(
         entry_points=[
             CallbackQueryHandler(upload_attendance, pattern="^first_upload_attendance$"),
@@ -477,6 +654,7 @@ def handlers() -> list:
                 CallbackQueryHandler(set_lectures, pattern="^set_lectures$"),
                 CallbackQueryHandler(set_users, pattern="^set_users$"),
                 CallbackQueryHandler(set_subgroup, pattern="^set_subgroup$"),
+                CallbackQueryHandler(show_analytics, pattern="^show_analytics$"),
                 CallbackQueryHandler(start_upload_attendance, pattern="^start_upload_attendance$")
             ],
             SET_DAY: [
@@ -495,12 +673,18 @@ def handlers() -> list:
         fallbacks=[
             CallbackQueryHandler(upload_attendance, pattern="^upload_attendance$"),
             CallbackQueryHandler(cancel, pattern='^cancel$')
-        ]
+        ],
+        name='upload_attendance',
+        persistent=True
     )
     
     return [
         admin_panel_handler,
+        stats_handler,
         upload_video_handler,
+        ping_handler,
+        stop_ping_handler,
+        manual_mark_handler,
         upload_attendance_handler        
     ]
 
@@ -0,0 +1,132 @@
+from copy import deepcopy
+from datetime import date
+from typing import NamedTuple
+
+import numpy as np
+from sqlalchemy import select
+
+from database.models import DailyAttendance, User
+from .export import (
+    Memo,
+    compile_daily_filters,
+    compile_user_filters,
+    full_name,
+    iter_rows,
+    latest_attendance_id,
+    lectures_mask,
+    memos,
+    normalize_settings,
+    run_in_pool
+)
+from .schedule import schedule
+
+reports = Memo(32)
+memos.append(reports)
+
+
+class Report(NamedTuple):
+    students: list[tuple[str, float]]
+    lectures: list[tuple[int, float]]
+    subgroups: list[tuple[int, float]]
+    weeks: list[tuple[date, float]]
+    days: int
+    held: int
+    total: float
+
+
+def rate(attended: np.ndarray, possible: np.ndarray) -> np.ndarray:
+    return np.divide(attended, possible, out=np.zeros(np.shape(attended)), where=possible > 0)
+
+
+def build_report(settings: dict) -> Report | None:
+    key = normalize_settings(settings)
+    _, lectures, users, subgroup = key
+
+    students = list(iter_rows(
+        select(User.id, User.last_name, User.first_name, User.middle_name, User.subgroup)
+        .where(*compile_user_filters(users, subgroup))
+        .order_by(User.id)
+    ))
+    rows = list(iter_rows(
+        select(DailyAttendance.user_id, DailyAttendance.date, DailyAttendance.lectures)
+        .join(User, DailyAttendance.user_id == User.id)
+        .where(*compile_daily_filters(key))
+    ))
+
+    if not students or not rows:
+        return None
+
+    user_ids = np.array([student.id for student in students])
+    names = [full_name(student) for student in students]
+    subgroups = np.array([student.subgroup or 0 for student in students])
+
+    user_index = np.searchsorted(user_ids, [row.user_id for row in rows])
+    dates, date_index = np.unique([row.date for row in rows], return_inverse=True)
+
+    masks = np.zeros((len(user_ids), len(dates)), dtype=np.int64)
+    masks[user_index, date_index] = [row.lectures for row in rows]
+    masks &= lectures_mask(lectures)
+
+    slots = max(schedule.max_lectures, int(masks.max()).bit_length())
+    marks = (masks[..., None] >> np.arange(slots)) & 1 == 1
+    held = marks.any(axis=0)
+
+    student_rates = rate(marks.sum(axis=(1, 2)), np.full(len(user_ids), held.sum()))
+    lecture_rates = rate(marks.sum(axis=(0, 1)), held.sum(axis=0) * len(user_ids))
+
+    groups, group_index = np.unique(subgroups, return_inverse=True)
+    group_sizes = np.bincount(group_index)
+    group_marks = np.bincount(group_index, weights=marks.sum(axis=(1, 2)))
+
+    mondays = np.array([day.toordinal() - day.weekday() for day in dates])
+    weeks, week_index = np.unique(mondays, return_inverse=True)
+    week_marks = np.bincount(week_index, weights=marks.sum(axis=(0, 2)))
+    week_held = np.bincount(week_index, weights=held.sum(axis=1))
+
+    return Report(
+        students=sorted(
+            zip(names, student_rates.tolist()),
+            key=lambda item: (item[1], item[0])
+        ),
+        lectures=[
+            (slot + 1, value) for slot, value in enumerate(lecture_rates.tolist()) if held[:, slot].any()
+        ],
+        subgroups=list(zip(groups.tolist(), rate(group_marks, group_sizes * held.sum()).tolist())),
+        weeks=list(zip(map(date.fromordinal, weeks.tolist()), rate(week_marks, week_held * len(user_ids)).tolist())),
+        days=len(dates),
+        held=int(held.sum()),
+        total=float(rate(marks.sum(), held.sum() * len(user_ids)))
+    )
+
+
+async def get_report(settings: dict) -> Report | None:
+    settings = deepcopy(settings)
+    memo_key = (normalize_settings(settings), await latest_attendance_id())
+    return await reports.share(memo_key, lambda: run_in_pool(build_report, settings))
+
+
+def format_report(report: Report | None, limit: int = 40) -> str:
+    if report is None:
+        return '📈 Аналитика\n\n🔎 Нет отметок по выбранным настройкам'
+
+    text = (
+        '📈 Аналитика\n\n'
+        f'🌞 Дней: {report.days}, 💬 пар проведено: {report.held}\n'
+        f'📊 Средняя посещаемость: {report.total:.0%}\n\n'
+        '💬 По парам:\n'
+    )
+    text += ''.join(f'{lecture} пара - {value:.0%}\n' for lecture, value in report.lectures)
+
+    text += '\n💼 По подгруппам:\n'
+    text += ''.join(f'{subgroup or "-"} - {value:.0%}\n' for subgroup, value in report.subgroups)
+
+    text += '\n🗓 По неделям:\n'
+    text += ''.join(f'с {monday.strftime("%d.%m.%Y")} - {value:.0%}\n' for monday, value in report.weeks[-limit:])
+
+    text += '\n🎓 По студентам:\n'
+    text += ''.join(f'{name} - {value:.0%}\n' for name, value in report.students[:limit])
+
+    if len(report.students) > limit:
+        text += f'... и ещё {len(report.students) - limit}\n'
+
+    return text[:4096]
@@ -1,28 +1,33 @@
-from pathlib import Path
 from random import choice
 
 from telegram import Update, InlineKeyboardMarkup
+from telegram.error import BadRequest
 from telegram.ext import (
     CallbackQueryHandler,
     ContextTypes,
     ConversationHandler,
     MessageHandler,
+    TypeHandler,
     filters,
 )
 
-from config import CHALLENGES
-from database.db_setup import session
-from database.models import Attendance, User
-from .captcha import generate_captcha, get_lecture_number, get_current_time
+from sqlalchemy.dialects.sqlite import insert
 
+from config import CHALLENGES, STATE_TTL
+from database.cache import get_user
+from database.db_setup import session_scope
+from database.models import Attendance
+from database.rollup import rollup_params, upsert_statement
+from .captcha import captcha_pool
+from .proofs import ProofJob, proof_queue
+from .ratelimit import attendance_flows
+from .schedule import schedule
+from .state import captchas, challenges
+from .throttle import throttled
+from .today import today_marks
 
-CAPTCHA, CHALLENGE = range(2)
-
-CAPTCHA_SOLUTIONS = {}
-CAPTCHA_MESSAGES = {}
 
-CHALLENGE_SOLUTIONS = {}
-CHALLENGE_MESSAGES = {}
+CAPTCHA, CHALLENGE = range(2)
 
 
 def get_cancel_keyboard() -> InlineKeyboardMarkup:
@@ -33,100 +38,174 @@ def get_cancel_keyboard() -> InlineKeyboardMarkup:
     )
 
 
+async def delete_messages(context: ContextTypes.DEFAULT_TYPE, chat_id: int, message_ids: list[int]) -> None:
+    if not message_ids:
+        return
+
+    try:
+        await context.bot.delete_messages(chat_id=chat_id, message_ids=message_ids)
+    except BadRequest:
+        pass
+
+
+@throttled('attendance')
 async def attendance(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    await update.message.delete()
-    
     user_id = update.message.from_user.id
-    user = session.query(User).filter_by(telegram_id=user_id).first()
+    user = await get_user(user_id)
 
     if not user:
+        await update.message.delete()
         await update.message.reply_text('❌ Сначала зарегистрируйся - /reg')
         return ConversationHandler.END
 
-    if not get_lecture_number(get_current_time()):
+    current_lecture = schedule.lecture_number(schedule.now())
+
+    if not current_lecture:
+        await update.message.delete()
         await update.message.reply_text('💤 Бро, ты время видел? Какие пары...')
         return ConversationHandler.END
 
-    captcha_image, captcha_solution = generate_captcha()
-    CAPTCHA_SOLUTIONS[user_id] = captcha_solution
+    if today_marks.has(user.id, current_lecture):
+        await update.message.delete()
+        await update.message.reply_text(f'👌 Ты уже отмечен на {current_lecture} паре!')
+        return ConversationHandler.END
+
+    attendance_flows.start(update.message.chat_id)
+    captcha_image, captcha_solution = await captcha_pool.get()
 
-    CAPTCHA_MESSAGES[user_id] = await update.message.reply_photo(
+    captcha_message = await update.message.reply_photo(
         photo=captcha_image,
         caption=(
             '🤖 Введи текст с изображения, чтобы отметиться.'
         ),
         reply_markup=get_cancel_keyboard()
     )
+    await challenges.pop(user_id)
+    await captchas.put(
+        user_id,
+        captcha_message.chat_id,
+        captcha_message.message_id,
+        captcha_solution,
+        cleanup=[update.message.message_id],
+        lecture=current_lecture
+    )
     
     return CAPTCHA
 
 
 async def verify_captcha(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    await update.message.delete()
-    
     user_id = update.message.from_user.id
     user_input = update.message.text
+    captcha = await captchas.pop(user_id)
+
+    if not captcha:
+        await update.message.delete()
+        await update.message.reply_text('⌛ Время вышло, начни заново!')
+        return ConversationHandler.END
     
-    await context.bot.delete_message(
-            chat_id=update.message.chat_id,
-            message_id=CAPTCHA_MESSAGES[user_id].message_id
-        )
+    await delete_messages(context, captcha.chat_id, captcha.cleanup + [update.message.message_id])
 
-    if user_input.upper() == CAPTCHA_SOLUTIONS.get(user_id):
+    if user_input.upper() == captcha.text:
         challenge_text = (
             f'*{choice(CHALLENGES[0])}* и скажи '
             f'*"{choice(CHALLENGES[1])}"* на камеру'
         )
         
-        CHALLENGE_SOLUTIONS[user_id] = challenge_text
-        CHALLENGE_MESSAGES[user_id] = await update.message.reply_text(
-            f'Чтобы отметиться отправь видео-кружок 🤳\n{challenge_text}',
+        await context.bot.edit_message_caption(
+            chat_id=captcha.chat_id,
+            message_id=captcha.message_id,
+            caption=f'Чтобы отметиться отправь видео-кружок 🤳\n{challenge_text}',
             reply_markup=get_cancel_keyboard(),
             parse_mode='Markdown'
         )
+        await challenges.put(user_id, captcha.chat_id, captcha.message_id, challenge_text, lecture=captcha.lecture)
 
         return CHALLENGE
 
-    await update.message.reply_text('📛 Неверный ввод, отмена!')
+    await context.bot.edit_message_caption(
+        chat_id=captcha.chat_id,
+        message_id=captcha.message_id,
+        caption='📛 Неверный ввод, отмена!'
+    )
+    attendance_flows.finish(captcha.chat_id, 'failed')
     return ConversationHandler.END
 
 
 async def verify_challenge(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.message.from_user.id
-    user = session.query(User).filter_by(telegram_id=user_id).first()
-    
-    current_date = get_current_time()
-    current_lecture = get_lecture_number(current_date)
+    user = await get_user(user_id)
+    challenge = await challenges.pop(user_id)
+
+    if not challenge:
+        await update.message.reply_text('⌛ Время вышло, начни заново!')
+        return ConversationHandler.END
     
-    video_path = Path.cwd() / 'data' / 'proofs' / \
-        f'{user_id}_{current_date.strftime("%d%m%Y_%H%M%S")}.mp4'
+    current_date = schedule.now()
+    current_lecture = challenge.lecture or schedule.lecture_number(current_date)
+
+    if not current_lecture:
+        await context.bot.edit_message_caption(
+            chat_id=challenge.chat_id,
+            message_id=challenge.message_id,
+            caption='💤 Бро, ты время видел? Какие пары...'
+        )
+        attendance_flows.finish(challenge.chat_id, 'failed')
 
+        return ConversationHandler.END
+    
+    video_name = f'{user_id}_{current_date.strftime("%d%m%Y_%H%M%S")}.mp4'
     video_note = update.message.video_note
-    video = await context.bot.get_file(video_note.file_id)
-    await video.download_to_drive(video_path)
-
-    attendance = Attendance(
-        timestamp=current_date,
-        lecture_number=current_lecture,
-        user_id=user.id,
-        challenge=CHALLENGE_SOLUTIONS[user_id],
-        video_path=video_path.name
-    )
-    session.add(attendance)
-    session.commit()
-
-    await update.message.reply_text(
-        f'👌 Отметка поставлена!\n'
-        f'✍ {user.last_name} {user.first_name} {user.middle_name}\n'
-        f'🔔 {current_date.strftime("%d.%m.%Y %H:%M:%S")} - {current_lecture} пара\n\n'
-        f'👁‍🗨 Задание `{video_path.name}`:\n{CHALLENGE_SOLUTIONS[user_id]}\n',
+
+    async with session_scope() as session:
+        attendance_id = await session.scalar(
+            insert(Attendance)
+            .values(
+                timestamp=current_date,
+                date=current_date.date(),
+                lecture_number=current_lecture,
+                user_id=user.id,
+                challenge=challenge.text,
+                video_path=video_name,
+                status='pending',
+                file_id=video_note.file_id,
+                file_unique_id=video_note.file_unique_id
+            )
+            .on_conflict_do_nothing(index_elements=['user_id', 'date', 'lecture_number'])
+            .returning(Attendance.id)
+        )
+
+        if attendance_id is not None:
+            await session.execute(
+                upsert_statement(),
+                [rollup_params(user.id, current_date.date(), current_lecture)]
+            )
+
+    today_marks.add(user.id, current_date.date(), current_lecture)
+
+    if attendance_id is None:
+        await context.bot.edit_message_caption(
+            chat_id=challenge.chat_id,
+            message_id=challenge.message_id,
+            caption=f'👌 Ты уже отмечен на {current_lecture} паре!'
+        )
+        attendance_flows.finish(challenge.chat_id, 'failed')
+
+        return ConversationHandler.END
+
+    proof_queue.put(ProofJob(attendance_id, video_note.file_id))
+
+    await context.bot.edit_message_caption(
+        chat_id=challenge.chat_id,
+        message_id=challenge.message_id,
+        caption=(
+            f'👌 Отметка поставлена!\n'
+            f'✍ {user.last_name} {user.first_name} {user.middle_name}\n'
+            f'🔔 {current_date.strftime("%d.%m.%Y %H:%M:%S")} - {current_lecture} пара\n\n'
+            f'👁‍🗨 Задание `{video_name}`:\n{challenge.text}\n'
+        ),
         parse_mode='Markdown'
     )
-    
-    await context.bot.delete_message(
-            chat_id=update.message.chat_id,
-            message_id=CHALLENGE_MESSAGES[user_id].message_id
-        )
+    attendance_flows.finish(challenge.chat_id, 'marked')
     
     return ConversationHandler.END
 
@@ -134,13 +213,19 @@ async def verify_challenge(update: Update, context: ContextTypes.DEFAULT_TYPE):
 async def no_video(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.message.from_user.id
     
-    await update.message.reply_text('📛 Неверный ввод, отмена!')
+    challenge = await challenges.pop(user_id)
+    
     await update.message.delete()
     
-    await context.bot.delete_message(
-            chat_id=update.message.chat_id,
-            message_id=CHALLENGE_MESSAGES[user_id].message_id
+    if challenge:
+        await context.bot.edit_message_caption(
+            chat_id=challenge.chat_id,
+            message_id=challenge.message_id,
+            caption='📛 Неверный ввод, отмена!'
         )
+        attendance_flows.finish(challenge.chat_id, 'failed')
+    else:
+        await update.message.reply_text('📛 Неверный ввод, отмена!')
     
     return ConversationHandler.END
 
@@ -149,10 +234,32 @@ async def cancel(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     await query.answer('Отменено!')
     
-    await query.delete_message()
+    message_ids = [query.message.message_id]
+
+    for store in (captchas, challenges):
+        state = await store.pop(query.from_user.id, expired=True)
+
+        if state:
+            message_ids += state.cleanup
+    
+    await delete_messages(context, query.message.chat_id, message_ids)
+    attendance_flows.finish(query.message.chat_id, 'cancelled')
     return ConversationHandler.END
 
 
+async def timeout(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    user_id = update.effective_user.id
+
+    for store in (captchas, challenges):
+        state = await store.pop(user_id, expired=True)
+
+        if not state:
+            continue
+
+        await delete_messages(context, state.chat_id, [state.message_id] + state.cleanup)
+        attendance_flows.finish(state.chat_id, 'cancelled')
+
+
 def handlers() -> list[ConversationHandler]:
     attendance_handler = ConversationHandler(
         entry_points=[
@@ -165,8 +272,14 @@ def handlers() -> list[ConversationHandler]:
             CHALLENGE: [
                 MessageHandler(filters.VIDEO_NOTE, verify_challenge),
                 MessageHandler(filters.TEXT, no_video)
+            ],
+            ConversationHandler.TIMEOUT: [
+                TypeHandler(Update, timeout)
             ]
         },
-        fallbacks=[CallbackQueryHandler(cancel, pattern='^cancel$'),]
+        fallbacks=[CallbackQueryHandler(cancel, pattern='^cancel$'),],
+        conversation_timeout=STATE_TTL,
+        name='attendance',
+        persistent=True
     )
     return [attendance_handler]
@@ -1,24 +1,96 @@
-from telegram.ext import ApplicationBuilder, AIORateLimiter
+from datetime import time
+
+from telegram.ext import Application, ApplicationBuilder
 
 from .admin import handlers as admin_handlers
 from .default import handlers as default_handlers
 from .attendance import handlers as attendance_handlers
-from config import BOT_TOKEN
+from .broadcast import broadcaster, resume_broadcasts
+from .captcha import captcha_pool
+from .concurrency import UserOrderedUpdateProcessor
+from .export import export_executor
+from .persistence import BackendPersistence
+from .proofs import proof_queue, resume_pending_proofs
+from .ratelimit import rate_limiter
+from .schedule import schedule
+from .state import create_backend, evict_states, state_backend
+from .throttle import prune_buckets
+from .today import roll_over_marks, today_marks
+from .workers import run_workers
+from config import (
+    BOT_TOKEN,
+    BOT_WORKERS,
+    CONCURRENT_UPDATES,
+    STATE_BACKEND,
+    STATE_EVICT_INTERVAL,
+    STATE_FLUSH_INTERVAL
+)
+from database.db_setup import init_db
 
 
-def main():
-    application = ApplicationBuilder().token(BOT_TOKEN).rate_limiter(AIORateLimiter()).build()
-    
+async def on_startup(application) -> None:
+    await init_db()
+    await today_marks.seed()
+    await captcha_pool.warm_up()
+
+    if application.bot_data.get('worker', 0) == 0:
+        await resume_pending_proofs()
+        await resume_broadcasts()
+
+    proof_queue.start(application.bot)
+    broadcaster.start(application.bot)
+    application.job_queue.run_repeating(evict_states, interval=STATE_EVICT_INTERVAL)
+    application.job_queue.run_repeating(prune_buckets, interval=STATE_EVICT_INTERVAL)
+    application.job_queue.run_daily(roll_over_marks, time=time(tzinfo=schedule.time_zone))
+
+
+async def on_stop(application) -> None:
+    await broadcaster.stop()
+    await proof_queue.stop()
+
+
+async def on_shutdown(application) -> None:
+    captcha_pool.close()
+    export_executor.shutdown(wait=False, cancel_futures=True)
+    await state_backend.close()
+
+
+def build_application(updater: bool = True) -> Application:
+    builder = ApplicationBuilder() \
+        .token(BOT_TOKEN) \
+        .rate_limiter(rate_limiter) \
+        .concurrent_updates(UserOrderedUpdateProcessor(CONCURRENT_UPDATES)) \
+        .persistence(BackendPersistence(create_backend(), STATE_FLUSH_INTERVAL)) \
+        .post_init(on_startup) \
+        .post_stop(on_stop) \
+        .post_shutdown(on_shutdown)
+
+    if not updater:
+        builder = builder.updater(None)
+
+    application = builder.build()
+
     for handler in admin_handlers():
         application.add_handler(handler)
 
     for handler in attendance_handlers():
         application.add_handler(handler)
-    
+
     for handler in default_handlers():
         application.add_handler(handler)
-    
-    application.run_polling(drop_pending_updates=True)
+
+    return application
+
+
+def main():
+    if BOT_WORKERS > 1:
+        if STATE_BACKEND == 'memory':
+            raise ValueError('BOT_WORKERS > 1 needs a shared STATE_BACKEND (sqlite or redis)')
+
+        run_workers(BOT_WORKERS, build_application)
+        return
+
+    build_application().run_polling(drop_pending_updates=True)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,231 @@
+import asyncio
+import logging
+
+from sqlalchemy import case, func, select, update
+from telegram import Bot, InlineKeyboardMarkup
+from telegram.error import BadRequest, Forbidden, RetryAfter, TelegramError
+
+from config import (
+    BROADCAST_BATCH_SIZE,
+    BROADCAST_PROGRESS_INTERVAL,
+    BROADCAST_RATE,
+    BROADCAST_RETRIES
+)
+from database.db_setup import session_scope
+from database.models import Broadcast, User
+
+logger = logging.getLogger(__name__)
+
+
+class Pacer:
+    def __init__(self, rate: float) -> None:
+        self.interval = 1 / rate
+        self._next = 0.0
+
+    async def wait(self) -> None:
+        now = asyncio.get_running_loop().time()
+        slot = max(now, self._next)
+        self._next = slot + self.interval
+
+        await asyncio.sleep(slot - now)
+
+    def pause(self, seconds: float) -> None:
+        self._next = max(self._next, asyncio.get_running_loop().time() + seconds)
+
+
+def recipients_filter(subgroup: int | None) -> list:
+    return [User.subgroup == subgroup] if subgroup else []
+
+
+async def count_recipients(subgroup: int | None) -> int:
+    async with session_scope() as session:
+        return await session.scalar(select(func.count()).select_from(User).where(*recipients_filter(subgroup)))
+
+
+async def create_broadcast(chat_id: int, message_id: int, progress_message_id: int, subgroup: int | None) -> Broadcast:
+    async with session_scope() as session:
+        broadcast = Broadcast(
+            chat_id=chat_id,
+            message_id=message_id,
+            progress_message_id=progress_message_id,
+            subgroup=subgroup,
+            total=await count_recipients(subgroup)
+        )
+        session.add(broadcast)
+
+    return broadcast
+
+
+async def cancel_broadcast(broadcast_id: int) -> None:
+    async with session_scope() as session:
+        await session.execute(
+            update(Broadcast)
+            .where(Broadcast.id == broadcast_id, Broadcast.status == 'running')
+            .values(status='cancelled')
+        )
+
+
+def get_progress_keyboard(broadcast: Broadcast) -> InlineKeyboardMarkup | None:
+    if broadcast.status != 'running':
+        return None
+
+    return InlineKeyboardMarkup(
+        [
+            [{'text': 'Остановить', 'callback_data': f'stop_ping:{broadcast.id}'}]
+        ]
+    )
+
+
+def get_text_progress(broadcast: Broadcast) -> str:
+    statuses = {
+        'running': '⏳ Идёт',
+        'done': '✅ Завершена',
+        'cancelled': '🛑 Остановлена'
+    }
+    text = f'📢 Рассылка #{broadcast.id}\n\n'
+
+    if broadcast.subgroup:
+        text += f'💼 Подгруппа: {broadcast.subgroup}\n'
+
+    text += (
+        f'📨 Отправлено: {broadcast.sent}/{broadcast.total}\n'
+        f'⛔ Не доставлено: {broadcast.failed}\n'
+        f'{statuses[broadcast.status]}'
+    )
+
+    return text
+
+
+class Broadcaster:
+    def __init__(self, rate: float, batch_size: int, retries: int) -> None:
+        self.batch_size = batch_size
+        self.retries = retries
+        self.pacer = Pacer(rate)
+        self.queue: asyncio.Queue[int] = asyncio.Queue()
+        self._task: asyncio.Task | None = None
+        self._batch: asyncio.Task | None = None
+
+    def start(self, bot: Bot) -> None:
+        self._task = asyncio.create_task(self._worker(bot), name='broadcaster')
+
+    async def stop(self, timeout: float = 30) -> None:
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+
+        if self._batch and not self._batch.done():
+            try:
+                await asyncio.wait_for(self._batch, timeout)
+            except asyncio.TimeoutError:
+                logger.warning('Broadcast batch was interrupted, some messages may be sent twice')
+
+    def put(self, broadcast_id: int) -> None:
+        self.queue.put_nowait(broadcast_id)
+
+    async def _worker(self, bot: Bot) -> None:
+        while True:
+            broadcast_id = await self.queue.get()
+
+            try:
+                await self._run(bot, broadcast_id)
+            except Exception:
+                logger.exception('Broadcast %s crashed', broadcast_id)
+            finally:
+                self.queue.task_done()
+
+    async def _run(self, bot: Bot, broadcast_id: int) -> None:
+        async with session_scope() as session:
+            broadcast = await session.get(Broadcast, broadcast_id)
+
+        reported = asyncio.get_running_loop().time()
+
+        while broadcast.status == 'running':
+            self._batch = asyncio.create_task(self._send_batch(bot, broadcast))
+            await asyncio.shield(self._batch)
+
+            now = asyncio.get_running_loop().time()
+
+            if broadcast.status != 'running' or now - reported >= BROADCAST_PROGRESS_INTERVAL:
+                reported = now
+                await self._report(bot, broadcast)
+
+        logger.info('Broadcast %s %s: %s sent, %s failed', broadcast_id, broadcast.status, broadcast.sent, broadcast.failed)
+
+    async def _send_batch(self, bot: Bot, broadcast: Broadcast) -> None:
+        async with session_scope() as session:
+            users = (await session.execute(
+                select(User.id, User.telegram_id)
+                .where(User.id > broadcast.last_user_id, *recipients_filter(broadcast.subgroup))
+                .order_by(User.id)
+                .limit(self.batch_size)
+            )).all()
+
+        results = await asyncio.gather(*(self._send(bot, broadcast, telegram_id) for _, telegram_id in users))
+        sent = sum(results)
+
+        if users:
+            broadcast.last_user_id = users[-1].id
+
+        async with session_scope() as session:
+            broadcast.status = await session.scalar(
+                update(Broadcast)
+                .where(Broadcast.id == broadcast.id)
+                .values(
+                    last_user_id=broadcast.last_user_id,
+                    sent=Broadcast.sent + sent,
+                    failed=Broadcast.failed + len(results) - sent,
+                    status=Broadcast.status if users else case(
+                        (Broadcast.status == 'running', 'done'),
+                        else_=Broadcast.status
+                    )
+                )
+                .returning(Broadcast.status)
+            )
+
+        broadcast.sent += sent
+        broadcast.failed += len(results) - sent
+
+    async def _send(self, bot: Bot, broadcast: Broadcast, telegram_id: int) -> bool:
+        for attempt in range(self.retries + 1):
+            await self.pacer.wait()
+
+            try:
+                await bot.copy_message(
+                    chat_id=telegram_id,
+                    from_chat_id=broadcast.chat_id,
+                    message_id=broadcast.message_id
+                )
+                return True
+            except RetryAfter as error:
+                self.pacer.pause(error.retry_after)
+            except (BadRequest, Forbidden):
+                return False
+            except TelegramError:
+                await asyncio.sleep(2 ** attempt)
+
+        return False
+
+    async def _report(self, bot: Bot, broadcast: Broadcast) -> None:
+        try:
+            await bot.edit_message_text(
+                chat_id=broadcast.chat_id,
+                message_id=broadcast.progress_message_id,
+                text=get_text_progress(broadcast),
+                reply_markup=get_progress_keyboard(broadcast)
+            )
+        except TelegramError as error:
+            logger.warning('Could not report broadcast %s progress: %r', broadcast.id, error)
+
+
+async def resume_broadcasts() -> None:
+    async with session_scope() as session:
+        running = (await session.scalars(select(Broadcast.id).where(Broadcast.status == 'running'))).all()
+
+    for broadcast_id in running:
+        broadcaster.put(broadcast_id)
+
+    if running:
+        logger.info('Resumed %s interrupted broadcasts', len(running))
+
+
+broadcaster = Broadcaster(BROADCAST_RATE, BROADCAST_BATCH_SIZE, BROADCAST_RETRIES)
@@ -1,35 +1,38 @@
-from datetime import datetime
+import asyncio
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from functools import cache, partial
 from io import BytesIO
 from random import choice, randint
 
+import numpy as np
 from PIL import Image, ImageDraw, ImageFont
-from pytz import timezone
 
-from config import SHEDULE
+from config import (
+    CAPTCHA_BACKEND,
+    CAPTCHA_BATCH_SIZE,
+    CAPTCHA_POOL_SIZE,
+    CAPTCHA_WORKERS
+)
 
 
-def get_current_time() -> datetime:
-    time_zone = timezone('Asia/Vladivostok')
-    return datetime.now(time_zone)
+CAPTCHA_ALPHABET = 'ERTYUPLKJHGFDSAZXCVBN23456789'
+CAPTCHA_LENGTH = 5
+CAPTCHA_SIZE = (150, 50)
 
-
-def get_lecture_number(current_time: datetime) -> int | None:
-    for index, (start, end) in enumerate(SHEDULE, start=1):
-        if start <= current_time.time() < end:
-            return index
-        
-    return None
+rng = np.random.default_rng()
 
 
 def generate_captcha() -> tuple[BytesIO, str]:
-    captcha_text = ''.join(choice('ERTYUPLKJHGFDSAZXCVBN23456789') for _ in range(5))
+    captcha_text = ''.join(choice(CAPTCHA_ALPHABET) for _ in range(CAPTCHA_LENGTH))
+    width, height = CAPTCHA_SIZE
     
-    image = Image.new('RGB', (150, 50), color=(255, 255, 255))
+    image = Image.new('RGB', CAPTCHA_SIZE, color=(255, 255, 255))
     font = ImageFont.load_default()
     draw = ImageDraw.Draw(image)
     
     for index, letter in enumerate(captcha_text):
-        x = 15 + index * (150 / 5)
+        x = 15 + index * (width / CAPTCHA_LENGTH)
         y = randint(10, 30)
         draw.text(
             (x, y),
@@ -40,14 +43,14 @@ def generate_captcha() -> tuple[BytesIO, str]:
 
     for _ in range(3):
         draw.line(
-            [(randint(0, 150), randint(0, 50)), (randint(0, 150), randint(0, 50))],
+            [(randint(0, width), randint(0, height)), (randint(0, width), randint(0, height))],
             fill=(randint(0, 200), randint(0, 200), randint(0, 200)),
             width=1
         )
         
     for _ in range(120):
         draw.point(
-            (randint(0, 150), randint(0, 50)),
+            (randint(0, width), randint(0, height)),
             fill=(randint(0, 200), randint(0, 200), randint(0, 200), 128)
         )
 
@@ -56,3 +59,155 @@ def generate_captcha() -> tuple[BytesIO, str]:
     output.seek(0)
 
     return output, captcha_text
+
+
+@cache
+def get_font() -> ImageFont.ImageFont | ImageFont.FreeTypeFont:
+    return ImageFont.load_default()
+
+
+@cache
+def get_glyph_atlas() -> np.ndarray:
+    font = get_font()
+    width = max(font.getbbox(letter)[2] for letter in CAPTCHA_ALPHABET)
+    height = max(font.getbbox(letter)[3] for letter in CAPTCHA_ALPHABET)
+
+    atlas = np.zeros((len(CAPTCHA_ALPHABET), height, width), dtype=np.float32)
+
+    for index, letter in enumerate(CAPTCHA_ALPHABET):
+        glyph = Image.new('L', (width, height), color=0)
+        ImageDraw.Draw(glyph).text((0, 0), letter, font=font, fill=255)
+        atlas[index] = np.asarray(glyph, dtype=np.float32) / 255
+
+    return atlas
+
+
+def random_colors(*shape: int) -> np.ndarray:
+    return rng.integers(0, 201, size=(*shape, 3)).astype(np.float32)
+
+
+def generate_captcha_batch(count: int) -> list[tuple[BytesIO, str]]:
+    width, height = CAPTCHA_SIZE
+    atlas = get_glyph_atlas()
+    _, glyph_height, glyph_width = atlas.shape
+
+    canvas = np.full((count, height + glyph_height, width + glyph_width, 3), 255, dtype=np.float32)
+    batch = np.arange(count)[:, None, None]
+
+    letters = rng.integers(0, len(CAPTCHA_ALPHABET), size=(count, CAPTCHA_LENGTH))
+    tops = rng.integers(10, 31, size=(count, CAPTCHA_LENGTH))
+    colors = random_colors(count, CAPTCHA_LENGTH)
+
+    for position in range(CAPTCHA_LENGTH):
+        left = 15 + position * (width // CAPTCHA_LENGTH)
+        rows = tops[:, position, None, None] + np.arange(glyph_height)[None, :, None]
+        columns = left + np.arange(glyph_width)[None, None, :]
+
+        alpha = atlas[letters[:, position]][..., None]
+        color = colors[:, position, None, None, :]
+        region = canvas[batch, rows, columns]
+        canvas[batch, rows, columns] = region + (color - region) * alpha
+
+    steps = np.linspace(0, 1, max(CAPTCHA_SIZE) + 1)
+    starts = rng.integers(0, [width + 1, height + 1], size=(count, 3, 2))
+    ends = rng.integers(0, [width + 1, height + 1], size=(count, 3, 2))
+    line_points = np.rint(starts[..., None, :] + (ends - starts)[..., None, :] * steps[:, None]).astype(np.intp)
+    canvas[
+        np.arange(count)[:, None, None],
+        line_points[..., 1],
+        line_points[..., 0]
+    ] = random_colors(count, 3)[:, :, None, :]
+
+    noise = rng.integers(0, [width + 1, height + 1], size=(count, 120, 2))
+    canvas[np.arange(count)[:, None], noise[..., 1], noise[..., 0]] = random_colors(count, 120)
+
+    images = canvas[:, :height, :width].round().astype(np.uint8)
+    captchas = []
+
+    for image, text in zip(images, letters):
+        output = BytesIO()
+        Image.fromarray(image).save(output, format='PNG')
+        output.seek(0)
+
+        captchas.append((output, ''.join(CAPTCHA_ALPHABET[index] for index in text)))
+
+    return captchas
+
+
+def render_captchas(count: int) -> list[tuple[bytes, str]]:
+    if CAPTCHA_BACKEND == 'numpy':
+        captchas = generate_captcha_batch(count)
+    else:
+        captchas = [generate_captcha() for _ in range(count)]
+
+    return [(image.getvalue(), text) for image, text in captchas]
+
+
+class CaptchaPool:
+    def __init__(self, size: int, workers: int, batch_size: int) -> None:
+        self.size = size
+        self.batch_size = batch_size
+        self._ready: deque[tuple[bytes, str]] = deque()
+        self._pending = 0
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='captcha')
+
+    @property
+    def ready(self) -> int:
+        return len(self._ready)
+
+    def refill(self) -> list[asyncio.Future]:
+        loop = asyncio.get_running_loop()
+        futures = []
+        missing = self.size - len(self._ready) - self._pending
+
+        while missing > 0:
+            count = min(missing, self.batch_size)
+            missing -= count
+            self._pending += count
+
+            future = loop.run_in_executor(self._executor, render_captchas, count)
+            future.add_done_callback(partial(self._on_rendered, count))
+            futures.append(future)
+
+        return futures
+
+    def _on_rendered(self, count: int, future: asyncio.Future) -> None:
+        self._pending -= count
+
+        if not future.cancelled() and future.exception() is None:
+            self._ready.extend(future.result())
+
+    async def warm_up(self) -> None:
+        await asyncio.gather(*self.refill(), return_exceptions=True)
+
+    async def get(self) -> tuple[BytesIO, str]:
+        if self._ready:
+            image, text = self._ready.popleft()
+        else:
+            loop = asyncio.get_running_loop()
+            [(image, text)] = await loop.run_in_executor(self._executor, render_captchas, 1)
+
+        self.refill()
+        return BytesIO(image), text
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+captcha_pool = CaptchaPool(CAPTCHA_POOL_SIZE, CAPTCHA_WORKERS, CAPTCHA_BATCH_SIZE)
+
+
+def benchmark(count: int = 200) -> None:
+    from timeit import timeit
+
+    get_glyph_atlas()
+
+    pil = timeit(generate_captcha, number=count) / count
+    batch = timeit(lambda: generate_captcha_batch(count), number=1) / count
+
+    print(f'PIL:   {pil * 1000:.3f} ms/captcha')
+    print(f'NumPy: {batch * 1000:.3f} ms/captcha ({pil / batch:.1f}x)')
+
+
+if __name__ == '__main__':
+    benchmark()
@@ -0,0 +1,55 @@
+import asyncio
+import sys
+from contextlib import asynccontextmanager
+
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+
+class UserOrderedUpdateProcessor(BaseUpdateProcessor):
+    def __init__(self, max_concurrent_updates: int) -> None:
+        super().__init__(sys.maxsize)
+        self._slots = asyncio.Semaphore(max_concurrent_updates)
+        self._locks: dict[int, tuple[asyncio.Lock, int]] = {}
+
+    @property
+    def active_users(self) -> int:
+        return len(self._locks)
+
+    @asynccontextmanager
+    async def user_lock(self, update: object):
+        key = None
+
+        if isinstance(update, Update) and update.effective_user:
+            key = update.effective_user.id
+        elif isinstance(update, Update) and update.effective_chat:
+            key = update.effective_chat.id
+
+        if key is None:
+            yield
+            return
+
+        lock, users = self._locks.get(key, (None, 0))
+        lock = lock or asyncio.Lock()
+        self._locks[key] = (lock, users + 1)
+
+        try:
+            async with lock:
+                yield
+        finally:
+            lock, users = self._locks[key]
+
+            if users == 1:
+                del self._locks[key]
+            else:
+                self._locks[key] = (lock, users - 1)
+
+    async def do_process_update(self, update: object, coroutine) -> None:
+        async with self.user_lock(update), self._slots:
+            await coroutine
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
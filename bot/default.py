@@ -8,8 +8,12 @@ from telegram.ext import (
     filters
 )
 
-from database.db_setup import session
+from sqlalchemy import select
+
+from database.cache import get_user, user_cache
+from database.db_setup import session_scope
 from database.models import User
+from .export import clear_cache
 
 
 def get_main_keyboard():
@@ -55,32 +59,35 @@ async def reg(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         return
     
     last_name, first_name, middle_name = args
-    existing_user = session.query(User).filter_by(telegram_id=user.id).first()
-
     new_name = f'{last_name} {first_name} {middle_name}'
-    
-    if existing_user:
-        old_name = f'{existing_user.last_name} {existing_user.first_name} {existing_user.middle_name}'
-        
-        existing_user.first_name = first_name
-        existing_user.middle_name = middle_name
-        existing_user.last_name = last_name
-        session.commit()
 
+    async with session_scope() as session:
+        existing_user = await session.scalar(select(User).filter_by(telegram_id=user.id))
+
+        if existing_user:
+            old_name = f'{existing_user.last_name} {existing_user.first_name} {existing_user.middle_name}'
+
+            existing_user.first_name = first_name
+            existing_user.middle_name = middle_name
+            existing_user.last_name = last_name
+        else:
+            new_user = User(
+                telegram_id=user.id,
+                first_name=first_name,
+                middle_name=middle_name,
+                last_name=last_name
+            )
+            session.add(new_user)
+
+    user_cache.put(existing_user or new_user)
+    clear_cache()
+
+    if existing_user:
         await update.message.reply_text(
             f'🎓 Данные обновлены!\n'
             f'{old_name} > {new_name}'
         )
     else:
-        new_user = User(
-            telegram_id=user.id,
-            first_name=first_name,
-            middle_name=middle_name,
-            last_name=last_name
-        )
-        session.add(new_user)
-        session.commit()
-
         await update.message.reply_text(
             f'🎓 Регистрация успешна, {new_name}!'
         )
@@ -102,12 +109,17 @@ async def group(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         return
 
     group_number = int(args[0])
-    existing_user = session.query(User).filter_by(telegram_id=user.id).first()
+
+    async with session_scope() as session:
+        existing_user = await session.scalar(select(User).filter_by(telegram_id=user.id))
+
+        if existing_user:
+            existing_user.subgroup = group_number
 
     if existing_user:
-        existing_user.subgroup = group_number
-        session.commit()
-        
+        user_cache.put(existing_user)
+        clear_cache()
+
         await update.message.reply_text(
             f'💼 Подгруппа изменена на {group_number}!'
         )
@@ -118,8 +130,7 @@ async def group(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
 
 
 async def profile(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    user_id = update.message.from_user.id
-    existing_user = session.query(User).filter_by(telegram_id=user_id).first()
+    existing_user = await get_user(update.message.from_user.id)
 
     await update.message.delete()
 
@@ -0,0 +1,413 @@
+import asyncio
+import csv
+import json
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from copy import deepcopy
+from datetime import date, datetime
+from functools import lru_cache
+from io import TextIOWrapper
+from shutil import copyfileobj
+from tempfile import SpooledTemporaryFile
+from typing import BinaryIO, Iterator, TextIO
+from zipfile import ZIP_DEFLATED, ZipFile
+
+from sqlalchemy import Row, Select, func, select
+from telegram import Bot
+
+from config import EXPORT_WORKERS
+from database.db_setup import engine, sync_engine, and_, or_
+from database.models import Attendance, DailyAttendance, User
+from database.rollup import lecture_bit
+from .schedule import schedule
+
+EXPORT_BATCH_SIZE = 1000
+EXPORT_SPOOL_SIZE = 8 * 1024 * 1024
+EXPORT_CACHE_SIZE = 4
+
+EXPORT_COLUMNS = (
+    Attendance.id,
+    User.telegram_id,
+    User.last_name,
+    User.first_name,
+    User.middle_name,
+    User.subgroup,
+    Attendance.timestamp,
+    Attendance.date,
+    Attendance.lecture_number,
+    Attendance.challenge,
+    Attendance.video_path
+)
+
+DAILY_COLUMNS = (
+    User.telegram_id,
+    User.last_name,
+    User.first_name,
+    User.middle_name,
+    DailyAttendance.date,
+    DailyAttendance.lectures
+)
+
+
+class Memo:
+    def __init__(self, max_size: int) -> None:
+        self.max_size = max_size
+        self._values = OrderedDict()
+
+    def get(self, key):
+        if key not in self._values:
+            return None
+
+        self._values.move_to_end(key)
+        return self._values[key]
+
+    def put(self, key, value) -> None:
+        self._values[key] = value
+        self._values.move_to_end(key)
+
+        if len(self._values) > self.max_size:
+            self._values.popitem(last=False)
+
+    def discard(self, key, value) -> None:
+        if self._values.get(key) is value:
+            del self._values[key]
+
+    def clear(self) -> None:
+        self._values.clear()
+
+    async def share(self, key, factory):
+        task = self.get(key)
+
+        if task is None:
+            task = asyncio.ensure_future(factory())
+            self.put(key, task)
+
+        try:
+            return await asyncio.shield(task)
+        except Exception:
+            self.discard(key, task)
+            raise
+
+
+counts = Memo(128)
+exports = Memo(EXPORT_CACHE_SIZE)
+memos = [counts, exports]
+
+export_executor = ThreadPoolExecutor(max_workers=EXPORT_WORKERS, thread_name_prefix='export')
+
+
+def normalize_settings(settings: dict) -> tuple:
+    days = sorted({tuple(day.strip() for day in day_group) for day_group in settings['days'] or ()})
+    lectures = sorted({int(lecture) for lecture in settings['lectures'] or ()})
+    users = sorted({' '.join(full_name.split()) for full_name in settings['users'] or ()})
+
+    return tuple(days), tuple(lectures), tuple(users), settings['subgroup'] or None
+
+
+def parse_day_ranges(days: tuple) -> list[tuple[datetime, datetime]]:
+    day_ranges = []
+
+    for day_group in days:
+        day_start = datetime.strptime(day_group[0], "%d.%m.%Y")
+        day_end = day_start
+
+        if len(day_group) == 2:
+            day_end = datetime.strptime(day_group[1], "%d.%m.%Y")
+
+        day_ranges.append((day_start, day_end.replace(hour=23, minute=59, second=59)))
+
+    return day_ranges
+
+
+def compile_user_filters(users: tuple, subgroup: int | None) -> list:
+    filters = []
+
+    if users:
+        user_filters = []
+
+        for user_full_name in users:
+            last_name, first_name, middle_name = user_full_name.split()
+            user_filters.append(and_(
+                User.last_name == last_name,
+                User.first_name == first_name,
+                User.middle_name == middle_name
+            ))
+
+        filters.append(or_(*user_filters))
+
+    if subgroup:
+        filters.append(User.subgroup == subgroup)
+
+    return filters
+
+
+def lectures_mask(lectures: tuple) -> int:
+    if not lectures:
+        return -1
+
+    return sum(lecture_bit(lecture) for lecture in set(lectures))
+
+
+@lru_cache(maxsize=128)
+def compile_filters(key: tuple) -> tuple:
+    days, lectures, users, subgroup = key
+    filters = []
+
+    if days:
+        filters.append(or_(*(
+            Attendance.timestamp.between(day_start, day_end)
+            for day_start, day_end in parse_day_ranges(days)
+        )))
+
+    if lectures:
+        filters.append(Attendance.lecture_number.in_(lectures))
+
+    return tuple(filters + compile_user_filters(users, subgroup))
+
+
+@lru_cache(maxsize=128)
+def compile_daily_filters(key: tuple) -> tuple:
+    days, lectures, users, subgroup = key
+    filters = []
+
+    if days:
+        filters.append(or_(*(
+            DailyAttendance.date.between(day_start.date(), day_end.date())
+            for day_start, day_end in parse_day_ranges(days)
+        )))
+
+    if lectures:
+        filters.append(DailyAttendance.lectures.op('&')(lectures_mask(lectures)) != 0)
+
+    return tuple(filters + compile_user_filters(users, subgroup))
+
+
+def build_query(settings: dict) -> Select:
+    return select(*EXPORT_COLUMNS) \
+        .join(User, Attendance.user_id == User.id) \
+        .where(*compile_filters(normalize_settings(settings))) \
+        .order_by(Attendance.timestamp)
+
+
+def build_daily_query(settings: dict) -> Select:
+    return select(*DAILY_COLUMNS) \
+        .join(User, DailyAttendance.user_id == User.id) \
+        .where(*compile_daily_filters(normalize_settings(settings)))
+
+
+def iter_rows(query: Select) -> Iterator[Row]:
+    with sync_engine.connect() as connection:
+        yield from connection.execute(query.execution_options(yield_per=EXPORT_BATCH_SIZE))
+
+
+async def latest_attendance_id() -> int:
+    async with engine.connect() as connection:
+        return await connection.scalar(select(func.max(Attendance.id))) or 0
+
+
+async def fetch_count(key: tuple) -> int:
+    query = select(func.count()) \
+        .select_from(Attendance) \
+        .join(User, Attendance.user_id == User.id) \
+        .where(*compile_filters(key))
+
+    async with engine.connect() as connection:
+        return await connection.scalar(query)
+
+
+async def count_rows(settings: dict) -> int:
+    key = normalize_settings(settings)
+    return await counts.share((key, await latest_attendance_id()), lambda: fetch_count(key))
+
+
+def clear_cache() -> None:
+    for memo in memos:
+        memo.clear()
+
+
+def full_name(row: Row) -> str:
+    return f'{row.last_name} {row.first_name} {row.middle_name}'
+
+
+class SimpleCsvWriter:
+    def __init__(self, file: TextIO, lectures: int = -1) -> None:
+        self.file = file
+        self.lectures = lectures
+        self.names: dict[int, str] = {}
+        self.masks: dict[tuple[int, date], int] = {}
+
+    def write(self, row: Row) -> None:
+        if row.telegram_id not in self.names:
+            self.names[row.telegram_id] = full_name(row)
+
+        key = (row.telegram_id, row.date)
+        self.masks[key] = self.masks.get(key, 0) | row.lectures & self.lectures
+
+    def close(self) -> None:
+        dates = sorted({day for _, day in self.masks})
+        date_index = {day: index for index, day in enumerate(dates)}
+
+        lectures = max([schedule.max_lectures, *(mask.bit_length() for mask in self.masks.values())])
+        matrix = {telegram_id: [''] * (len(dates) * lectures) for telegram_id in self.names}
+
+        for (telegram_id, day), mask in self.masks.items():
+            cells = matrix[telegram_id]
+            offset = date_index[day] * lectures
+
+            while mask:
+                bit = mask & -mask
+                cells[offset + bit.bit_length() - 1] = 1
+                mask ^= bit
+
+        header = ['Дата']
+        subheader = ['Пара']
+
+        for day in dates:
+            header += [day.strftime("%d.%m.%Y")] + [' '] * (lectures - 1)
+            subheader += [str(i) for i in range(1, lectures + 1)]
+
+        writer = csv.writer(self.file, delimiter=";")
+
+        writer.writerow(header)
+        writer.writerow(subheader)
+
+        for telegram_id in sorted(self.names, key=self.names.get):
+            writer.writerow([self.names[telegram_id]] + matrix[telegram_id])
+
+
+class ExtendedCsvWriter:
+    def __init__(self, file: TextIO) -> None:
+        self.writer = csv.writer(file, delimiter=";")
+        self.writer.writerow(['ID Отметки', 'Telegram ID', 'ФИО', 'Подгруппа', 'Дата', 'Время','Пара', 'Задание', 'Подтверждение'])
+
+    def write(self, row: Row) -> None:
+        user = [row.id, row.telegram_id, full_name(row), row.subgroup]
+        pare = [row.timestamp.strftime("%d.%m.%Y"), row.timestamp.strftime("%H:%M:%S"), row.lecture_number, row.challenge, row.video_path]
+
+        self.writer.writerow(user + pare)
+
+    def close(self) -> None:
+        pass
+
+
+class JsonWriter:
+    keys = ['Telegram ID', 'ФИО', 'Подгруппа', 'Дата', 'Время', 'Пара', 'Задание', 'Подтверждение']
+
+    def __init__(self, file: TextIO) -> None:
+        self.file = file
+        self.separator = '\n'
+        self.file.write('{')
+
+    def write(self, row: Row) -> None:
+        user = [row.telegram_id, full_name(row), row.subgroup]
+        pare = [row.timestamp.strftime("%d.%m.%Y"), row.timestamp.strftime("%H:%M:%S"), row.lecture_number, row.challenge, row.video_path]
+        value = json.dumps(dict(zip(self.keys, user + pare)), indent=4, ensure_ascii=False)
+
+        self.file.write(f'{self.separator}    "{row.id}": {value.replace(chr(10), chr(10) + "    ")}')
+        self.separator = ',\n'
+
+    def close(self) -> None:
+        self.file.write('}' if self.separator == '\n' else '\n}')
+
+
+def export_rows(query: Select, *writers) -> int:
+    count = 0
+
+    for row in iter_rows(query):
+        for writer in writers:
+            writer.write(row)
+
+        count += 1
+
+    for writer in writers:
+        writer.close()
+
+    return count
+
+
+EXPORT_FILES = {
+    'simpe_attendance.csv': 'utf-8-sig',
+    'extended_attendance.csv': 'utf-8-sig',
+    'extended_attendance.json': 'utf-8'
+}
+
+
+def open_buffer(encoding: str) -> TextIOWrapper:
+    return TextIOWrapper(SpooledTemporaryFile(max_size=EXPORT_SPOOL_SIZE), encoding=encoding, newline='')
+
+
+def build_export(settings: dict) -> tuple[int, dict[str, BinaryIO]]:
+    buffers = {name: open_buffer(encoding) for name, encoding in EXPORT_FILES.items()}
+    _, lectures, _, _ = normalize_settings(settings)
+
+    export_rows(
+        build_daily_query(settings),
+        SimpleCsvWriter(buffers['simpe_attendance.csv'], lectures_mask(lectures))
+    )
+    count = export_rows(
+        build_query(settings),
+        ExtendedCsvWriter(buffers['extended_attendance.csv']),
+        JsonWriter(buffers['extended_attendance.json'])
+    )
+    files = {}
+
+    for name, buffer in buffers.items():
+        buffer.flush()
+        files[name] = buffer.detach()
+        files[name].seek(0)
+
+    return count, files
+
+
+def bundle_files(files: dict[str, BinaryIO]) -> BinaryIO:
+    archive = SpooledTemporaryFile(max_size=EXPORT_SPOOL_SIZE)
+
+    with ZipFile(archive, 'w', compression=ZIP_DEFLATED) as zip_file:
+        for name, file in files.items():
+            with file, zip_file.open(name, 'w') as entry:
+                copyfileobj(file, entry)
+
+    archive.seek(0)
+    return archive
+
+
+def render_export(settings: dict, bundle: bool) -> dict[str, BinaryIO]:
+    _, files = build_export(settings)
+
+    if bundle:
+        files = {'attendance.zip': bundle_files(files)}
+
+    return files
+
+
+async def run_in_pool(function, *args):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(export_executor, function, *args)
+
+
+async def send_export(bot: Bot, chat_id: int, settings: dict, bundle: bool) -> None:
+    settings = deepcopy(settings)
+    memo_key = (normalize_settings(settings), await latest_attendance_id(), bundle)
+    uploaded = False
+
+    async def upload() -> dict[str, str]:
+        nonlocal uploaded
+        files = await run_in_pool(render_export, settings, bundle)
+        file_ids = {}
+
+        try:
+            for name, file in files.items():
+                message = await bot.send_document(chat_id=chat_id, document=file, filename=name)
+                file_ids[name] = message.document.file_id
+        finally:
+            for file in files.values():
+                file.close()
+
+        uploaded = True
+        return file_ids
+
+    file_ids = await exports.share(memo_key, upload)
+
+    if not uploaded:
+        for file_id in file_ids.values():
+            await bot.send_document(chat_id=chat_id, document=file_id)
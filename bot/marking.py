@@ -0,0 +1,110 @@
+from datetime import date, timedelta
+from typing import NamedTuple
+
+from sqlalchemy import select, tuple_
+from sqlalchemy.dialects.sqlite import insert
+
+from database.db_setup import session_scope
+from database.models import Attendance, User
+from database.rollup import lecture_bit, upsert_statement
+from .export import parse_day_ranges
+from .schedule import schedule
+from .today import today_marks
+
+MANUAL_CHALLENGE = '🖊️ Отмечен вручную'
+
+
+class MarkResult(NamedTuple):
+    users: int
+    missing: list[str]
+    inserted: int
+    skipped: int
+    invalid: int
+
+
+def expand_days(days: list[list[str]]) -> list[date]:
+    expanded = set()
+
+    for day_start, day_end in parse_day_ranges(tuple(tuple(day_group) for day_group in days)):
+        day = day_start.date()
+
+        while day <= day_end.date():
+            expanded.add(day)
+            day += timedelta(days=1)
+
+    return sorted(expanded)
+
+
+async def resolve_users(names: list[str]) -> dict[str, int]:
+    keys = [tuple(name.split()) for name in names if len(name.split()) == 3]
+
+    if not keys:
+        return {}
+
+    async with session_scope() as session:
+        rows = await session.execute(
+            select(User.id, User.last_name, User.first_name, User.middle_name)
+            .where(tuple_(User.last_name, User.first_name, User.middle_name).in_(keys))
+        )
+
+    return {f'{row.last_name} {row.first_name} {row.middle_name}': row.id for row in rows}
+
+
+async def mark_attendance(names: list[str], days: list[date], lectures: list[int]) -> MarkResult:
+    users = await resolve_users(names)
+    rows = []
+    invalid = 0
+
+    for day in days:
+        for lecture in lectures:
+            bounds = schedule.lecture_bounds(day, lecture)
+
+            if bounds is None:
+                invalid += len(users)
+                continue
+
+            rows += [
+                {
+                    'timestamp': bounds[0],
+                    'date': day,
+                    'lecture_number': lecture,
+                    'user_id': user_id,
+                    'challenge': MANUAL_CHALLENGE,
+                    'video_path': '',
+                    'status': 'manual'
+                }
+                for user_id in users.values()
+            ]
+
+    inserted = []
+
+    if rows:
+        async with session_scope() as session:
+            inserted = (await session.execute(
+                insert(Attendance)
+                .on_conflict_do_nothing(index_elements=['user_id', 'date', 'lecture_number'])
+                .returning(Attendance.user_id, Attendance.date, Attendance.lecture_number),
+                rows
+            )).all()
+
+            masks = {}
+
+            for user_id, day, lecture in inserted:
+                masks[user_id, day] = masks.get((user_id, day), 0) | lecture_bit(lecture)
+
+            if masks:
+                await session.execute(
+                    upsert_statement(),
+                    [{'user_id': user_id, 'date': day, 'lectures': mask} for (user_id, day), mask in masks.items()]
+                )
+
+    for user_id, day, lecture in inserted:
+        today_marks.add(user_id, day, lecture)
+
+    return MarkResult(
+        users=len(users),
+        missing=[name for name in names if name not in users],
+        inserted=len(inserted),
+        skipped=len(rows) - len(inserted),
+        invalid=invalid
+    )
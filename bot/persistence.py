@@ -0,0 +1,75 @@
+import json
+
+from telegram.ext import BasePersistence, PersistenceInput
+
+from .state import StateBackend
+
+
+class BackendPersistence(BasePersistence):
+    def __init__(self, backend: StateBackend, update_interval: float) -> None:
+        super().__init__(
+            store_data=PersistenceInput(bot_data=False, chat_data=False, user_data=True, callback_data=False),
+            update_interval=update_interval
+        )
+        self.backend = backend
+
+    async def get_user_data(self) -> dict[int, dict]:
+        return {
+            int(key.removeprefix('user_data:')): json.loads(value)
+            for key, value in await self.backend.scan('user_data:')
+        }
+
+    async def update_user_data(self, user_id: int, data: dict) -> None:
+        await self.backend.set(f'user_data:{user_id}', json.dumps(data, ensure_ascii=False))
+
+    async def drop_user_data(self, user_id: int) -> None:
+        await self.backend.pop(f'user_data:{user_id}')
+
+    async def refresh_user_data(self, user_id: int, user_data: dict) -> None:
+        pass
+
+    async def get_conversations(self, name: str) -> dict:
+        prefix = f'conversation:{name}:'
+
+        return {
+            tuple(json.loads(key.removeprefix(prefix))): json.loads(value)
+            for key, value in await self.backend.scan(prefix)
+        }
+
+    async def update_conversation(self, name: str, key: tuple, new_state: object | None) -> None:
+        conversation_key = f'conversation:{name}:{json.dumps(key)}'
+
+        if new_state is None:
+            await self.backend.pop(conversation_key)
+        else:
+            await self.backend.set(conversation_key, json.dumps(new_state))
+
+    async def get_chat_data(self) -> dict:
+        return {}
+
+    async def update_chat_data(self, chat_id: int, data: dict) -> None:
+        pass
+
+    async def drop_chat_data(self, chat_id: int) -> None:
+        pass
+
+    async def refresh_chat_data(self, chat_id: int, chat_data: dict) -> None:
+        pass
+
+    async def get_bot_data(self) -> dict:
+        return {}
+
+    async def update_bot_data(self, data: dict) -> None:
+        pass
+
+    async def refresh_bot_data(self, bot_data: dict) -> None:
+        pass
+
+    async def get_callback_data(self) -> None:
+        return None
+
+    async def update_callback_data(self, data) -> None:
+        pass
+
+    async def flush(self) -> None:
+        await self.backend.close()
@@ -0,0 +1,123 @@
+import asyncio
+import logging
+from typing import NamedTuple
+
+from sqlalchemy import select, update
+from telegram import Bot
+from telegram.error import RetryAfter, TelegramError
+
+from config import PROOF_RETRIES, PROOF_RETRY_DELAY, PROOF_WORKERS
+from database.db_setup import session_scope
+from database.models import Attendance
+from .storage import INCOMING_DIR, store
+
+logger = logging.getLogger(__name__)
+
+
+class ProofJob(NamedTuple):
+    attendance_id: int
+    file_id: str
+
+
+class ProofQueue:
+    def __init__(self, workers: int, retries: int, retry_delay: float) -> None:
+        self.workers = workers
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self.queue: asyncio.Queue[ProofJob] = asyncio.Queue()
+        self._tasks: list[asyncio.Task] = []
+
+    def start(self, bot: Bot) -> None:
+        self._tasks = [
+            asyncio.create_task(self._worker(bot), name=f'proof-worker-{index}')
+            for index in range(self.workers)
+        ]
+
+    async def stop(self, timeout: float = 30) -> None:
+        try:
+            await asyncio.wait_for(self.queue.join(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning('%s proofs were not downloaded before shutdown', self.queue.qsize())
+
+        for task in self._tasks:
+            task.cancel()
+
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def put(self, job: ProofJob) -> None:
+        self.queue.put_nowait(job)
+
+    async def _worker(self, bot: Bot) -> None:
+        while True:
+            job = await self.queue.get()
+
+            try:
+                await self._ingest(bot, job)
+            except Exception:
+                logger.exception('Proof ingestion crashed for attendance %s', job.attendance_id)
+            finally:
+                self.queue.task_done()
+
+    async def _ingest(self, bot: Bot, job: ProofJob) -> None:
+        for attempt in range(self.retries + 1):
+            try:
+                proof_id = await self._download(bot, job)
+            except (TelegramError, OSError) as error:
+                if attempt == self.retries:
+                    logger.error('Failed to download proof for attendance %s: %r', job.attendance_id, error)
+                    await set_status(job.attendance_id, 'failed')
+                    return
+
+                if isinstance(error, RetryAfter):
+                    delay = error.retry_after
+                else:
+                    delay = self.retry_delay * 2 ** attempt
+
+                await asyncio.sleep(delay)
+            else:
+                await set_status(job.attendance_id, 'ready', proof_id=proof_id)
+                return
+
+    async def _download(self, bot: Bot, job: ProofJob) -> int:
+        temp_path = INCOMING_DIR / f'{job.attendance_id}.part'
+        temp_path.parent.mkdir(parents=True, exist_ok=True)
+
+        try:
+            file = await bot.get_file(job.file_id)
+            await file.download_to_drive(temp_path)
+
+            return await store(temp_path)
+        except BaseException:
+            temp_path.unlink(missing_ok=True)
+            raise
+
+
+async def set_status(attendance_id: int, status: str, **values) -> None:
+    async with session_scope() as session:
+        await session.execute(
+            update(Attendance).where(Attendance.id == attendance_id).values(status=status, **values)
+        )
+
+
+async def resume_pending_proofs() -> None:
+    async with session_scope() as session:
+        pending = await session.execute(
+            select(Attendance.id, Attendance.file_id).where(Attendance.status == 'pending')
+        )
+        pending = pending.all()
+
+        await session.execute(
+            update(Attendance)
+            .where(Attendance.status == 'pending', Attendance.file_id.is_(None))
+            .values(status='failed')
+        )
+
+    for attendance_id, file_id in pending:
+        if file_id is not None:
+            proof_queue.put(ProofJob(attendance_id, file_id))
+
+    if pending:
+        logger.info('Resumed %s interrupted proof downloads', len(pending))
+
+
+proof_queue = ProofQueue(PROOF_WORKERS, PROOF_RETRIES, PROOF_RETRY_DELAY)
@@ -0,0 +1,50 @@
+from collections import Counter
+
+from telegram.ext import AIORateLimiter
+
+from config import BOT_WORKERS
+
+TELEGRAM_OVERALL_RATE = 30  # requests per second for the whole bot
+
+
+class CountingRateLimiter(AIORateLimiter):
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.endpoints: Counter[str] = Counter()
+        self.chats: Counter[int] = Counter()
+
+    async def process_request(self, callback, args, kwargs, endpoint, data, rate_limit_args):
+        self.endpoints[endpoint] += 1
+        chat_id = data.get('chat_id')
+
+        if isinstance(chat_id, int):
+            self.chats[chat_id] += 1
+
+        return await super().process_request(callback, args, kwargs, endpoint, data, rate_limit_args)
+
+
+class FlowStats:
+    def __init__(self, limiter: CountingRateLimiter) -> None:
+        self.limiter = limiter
+        self.flows: Counter[str] = Counter()
+        self.calls: Counter[str] = Counter()
+        self._started: dict[int, int] = {}
+
+    def start(self, chat_id: int) -> None:
+        self._started[chat_id] = self.limiter.chats[chat_id]
+
+    def finish(self, chat_id: int, outcome: str) -> None:
+        started = self._started.pop(chat_id, None)
+
+        if started is None:
+            return
+
+        self.flows[outcome] += 1
+        self.calls[outcome] += self.limiter.chats[chat_id] - started
+
+    def average(self, outcome: str) -> float:
+        return self.calls[outcome] / self.flows[outcome] if self.flows[outcome] else 0.0
+
+
+rate_limiter = CountingRateLimiter(overall_max_rate=TELEGRAM_OVERALL_RATE / BOT_WORKERS)
+attendance_flows = FlowStats(rate_limiter)
@@ -0,0 +1,93 @@
+from bisect import bisect_right
+from datetime import date, datetime, time, timedelta
+
+from pytz import timezone
+
+from config import SHEDULE, SHEDULE_OVERRIDES, TIME_ZONE
+
+
+def to_seconds(value: time) -> int:
+    return value.hour * 3600 + value.minute * 60 + value.second
+
+
+class Timetable:
+    __slots__ = ('slots', 'starts', 'ends')
+
+    def __init__(self, slots: list[tuple[time, time]]) -> None:
+        self.slots = sorted(slots)
+        self.starts = [to_seconds(start) for start, _ in self.slots]
+        self.ends = [to_seconds(end) for _, end in self.slots]
+
+    def __len__(self) -> int:
+        return len(self.slots)
+
+    def lecture_number(self, moment: time) -> int | None:
+        seconds = to_seconds(moment)
+        index = bisect_right(self.starts, seconds) - 1
+
+        if index >= 0 and seconds < self.ends[index]:
+            return index + 1
+
+        return None
+
+    def next_start(self, moment: time) -> time | None:
+        index = bisect_right(self.starts, to_seconds(moment))
+
+        if index < len(self.slots):
+            return self.slots[index][0]
+
+        return None
+
+
+class Schedule:
+    def __init__(
+        self,
+        slots: list[tuple[time, time]],
+        overrides: dict[int | date, list[tuple[time, time]]],
+        time_zone: str
+    ) -> None:
+        self.default = Timetable(slots)
+        self.overrides = {key: Timetable(value) for key, value in overrides.items()}
+        self.time_zone = timezone(time_zone)
+        self.max_lectures = max(map(len, [self.default, *self.overrides.values()]))
+
+    def now(self) -> datetime:
+        return datetime.now(self.time_zone)
+
+    def timetable(self, day: date) -> Timetable:
+        if day in self.overrides:
+            return self.overrides[day]
+
+        return self.overrides.get(day.weekday(), self.default)
+
+    def lecture_number(self, moment: datetime) -> int | None:
+        return self.timetable(moment.date()).lecture_number(moment.time())
+
+    def lecture_bounds(self, day: date, number: int) -> tuple[datetime, datetime] | None:
+        timetable = self.timetable(day)
+
+        if not 1 <= number <= len(timetable):
+            return None
+
+        start, end = timetable.slots[number - 1]
+
+        return (
+            self.time_zone.localize(datetime.combine(day, start)),
+            self.time_zone.localize(datetime.combine(day, end))
+        )
+
+    def next_lecture_start(self, moment: datetime, days_ahead: int = 14) -> datetime | None:
+        day, after = moment.date(), moment.time()
+
+        for _ in range(days_ahead + 1):
+            start = self.timetable(day).next_start(after)
+
+            if start is not None:
+                return self.time_zone.localize(datetime.combine(day, start))
+
+            day, after = day + timedelta(days=1), time.min
+
+        return None
+
+
+schedule = Schedule(SHEDULE, SHEDULE_OVERRIDES, TIME_ZONE)
@@ -0,0 +1,254 @@
+import json
+from collections import OrderedDict
+from time import time
+
+from sqlalchemy import delete, func, select
+from sqlalchemy.dialects.sqlite import insert
+from telegram.ext import ContextTypes
+
+from config import REDIS_URL, STATE_BACKEND, STATE_MAX_SIZE, STATE_TTL
+from database.db_setup import session_scope
+from database.models import StateEntry
+
+
+class StateBackend:
+    evicted = 0
+
+    async def get(self, key: str) -> str | None:
+        raise NotImplementedError
+
+    async def set(self, key: str, value: str, ttl: float | None = None) -> None:
+        raise NotImplementedError
+
+    async def pop(self, key: str) -> str | None:
+        raise NotImplementedError
+
+    async def scan(self, prefix: str) -> list[tuple[str, str]]:
+        raise NotImplementedError
+
+    async def count(self, prefix: str) -> int:
+        return len(await self.scan(prefix))
+
+    async def evict(self) -> int:
+        return 0
+
+    async def close(self) -> None:
+        pass
+
+
+class MemoryBackend(StateBackend):
+    def __init__(self, max_size: int | None = None) -> None:
+        self.max_size = max_size
+        self._values: OrderedDict[str, tuple[str, float | None]] = OrderedDict()
+
+    def _alive(self, key: str) -> str | None:
+        entry = self._values.get(key)
+
+        if entry is None:
+            return None
+
+        if entry[1] is not None and entry[1] < time():
+            del self._values[key]
+            self.evicted += 1
+            return None
+
+        return entry[0]
+
+    async def get(self, key: str) -> str | None:
+        return self._alive(key)
+
+    async def set(self, key: str, value: str, ttl: float | None = None) -> None:
+        self._values.pop(key, None)
+        self._values[key] = (value, time() + ttl if ttl is not None else None)
+
+        if self.max_size is not None and len(self._values) > self.max_size:
+            self._values.popitem(last=False)
+            self.evicted += 1
+
+    async def pop(self, key: str) -> str | None:
+        value = self._alive(key)
+        self._values.pop(key, None)
+        return value
+
+    async def scan(self, prefix: str) -> list[tuple[str, str]]:
+        return [
+            (key, value) for key in list(self._values)
+            if key.startswith(prefix) and (value := self._alive(key)) is not None
+        ]
+
+    async def evict(self) -> int:
+        now = time()
+        expired = [key for key, (_, expires) in self._values.items() if expires is not None and expires < now]
+
+        for key in expired:
+            del self._values[key]
+
+        self.evicted += len(expired)
+        return len(expired)
+
+
+class SqliteBackend(StateBackend):
+    @staticmethod
+    def alive():
+        return StateEntry.expires.is_(None) | (StateEntry.expires >= time())
+
+    async def get(self, key: str) -> str | None:
+        async with session_scope() as session:
+            return await session.scalar(select(StateEntry.value).where(StateEntry.key == key, self.alive()))
+
+    async def set(self, key: str, value: str, ttl: float | None = None) -> None:
+        expires = time() + ttl if ttl is not None else None
+        statement = insert(StateEntry).values(key=key, value=value, expires=expires)
+
+        async with session_scope() as session:
+            await session.execute(statement.on_conflict_do_update(
+                index_elements=[StateEntry.key],
+                set_={'value': statement.excluded.value, 'expires': statement.excluded.expires}
+            ))
+
+    async def pop(self, key: str) -> str | None:
+        async with session_scope() as session:
+            row = (await session.execute(
+                delete(StateEntry)
+                .where(StateEntry.key == key)
+                .returning(StateEntry.value, StateEntry.expires)
+            )).first()
+
+        if row is None or row.expires is not None and row.expires < time():
+            return None
+
+        return row.value
+
+    async def scan(self, prefix: str) -> list[tuple[str, str]]:
+        async with session_scope() as session:
+            rows = await session.execute(
+                select(StateEntry.key, StateEntry.value)
+                .where(StateEntry.key.startswith(prefix, autoescape=True), self.alive())
+            )
+
+        return [tuple(row) for row in rows]
+
+    async def count(self, prefix: str) -> int:
+        async with session_scope() as session:
+            return await session.scalar(
+                select(func.count())
+                .select_from(StateEntry)
+                .where(StateEntry.key.startswith(prefix, autoescape=True), self.alive())
+            )
+
+    async def evict(self) -> int:
+        async with session_scope() as session:
+            result = await session.execute(delete(StateEntry).where(StateEntry.expires < time()))
+
+        self.evicted += result.rowcount
+        return result.rowcount
+
+
+class RedisBackend(StateBackend):
+    def __init__(self, url: str) -> None:
+        from redis.asyncio import Redis
+
+        self.redis = Redis.from_url(url, decode_responses=True)
+
+    async def get(self, key: str) -> str | None:
+        return await self.redis.get(key)
+
+    async def set(self, key: str, value: str, ttl: float | None = None) -> None:
+        await self.redis.set(key, value, px=int(ttl * 1000) if ttl is not None else None)
+
+    async def pop(self, key: str) -> str | None:
+        return await self.redis.getdel(key)
+
+    async def scan(self, prefix: str) -> list[tuple[str, str]]:
+        keys = [key async for key in self.redis.scan_iter(match=f'{prefix}*')]
+
+        if not keys:
+            return []
+
+        return [(key, value) for key, value in zip(keys, await self.redis.mget(keys)) if value is not None]
+
+    async def count(self, prefix: str) -> int:
+        return len([key async for key in self.redis.scan_iter(match=f'{prefix}*')])
+
+    async def close(self) -> None:
+        await self.redis.aclose()
+
+
+def create_backend(max_size: int | None = None) -> StateBackend:
+    if STATE_BACKEND == 'sqlite':
+        return SqliteBackend()
+
+    if STATE_BACKEND == 'redis':
+        return RedisBackend(REDIS_URL)
+
+    return MemoryBackend(max_size)
+
+
+class State:
+    __slots__ = ('chat_id', 'message_id', 'text', 'expires', 'cleanup', 'lecture')
+
+    def __init__(
+        self,
+        chat_id: int,
+        message_id: int,
+        text: str,
+        expires: float,
+        cleanup: list[int],
+        lecture: int | None = None
+    ) -> None:
+        self.chat_id = chat_id
+        self.message_id = message_id
+        self.text = text
+        self.expires = expires
+        self.cleanup = cleanup
+        self.lecture = lecture
+
+
+class StateStore:
+    def __init__(self, backend: StateBackend, prefix: str, ttl: float) -> None:
+        self.backend = backend
+        self.prefix = prefix
+        self.ttl = ttl
+        self.expired = 0
+
+    async def put(
+        self,
+        user_id: int,
+        chat_id: int,
+        message_id: int,
+        text: str,
+        cleanup: list[int] | None = None,
+        lecture: int | None = None
+    ) -> State:
+        state = State(chat_id, message_id, text, time() + self.ttl, cleanup or [], lecture)
+        value = json.dumps([chat_id, message_id, text, state.expires, state.cleanup, lecture], ensure_ascii=False)
+
+        await self.backend.set(f'{self.prefix}:{user_id}', value, self.ttl * 2)
+        return state
+
+    async def pop(self, user_id: int, expired: bool = False) -> State | None:
+        value = await self.backend.pop(f'{self.prefix}:{user_id}')
+
+        if value is None:
+            return None
+
+        state = State(*json.loads(value))
+
+        if not expired and state.expires < time():
+            self.expired += 1
+            return None
+
+        return state
+
+    async def count(self) -> int:
+        return await self.backend.count(f'{self.prefix}:')
+
+
+state_backend = create_backend(STATE_MAX_SIZE)
+
+captchas = StateStore(state_backend, 'captcha', STATE_TTL)
+challenges = StateStore(state_backend, 'challenge', STATE_TTL)
+
+
+async def evict_states(context: ContextTypes.DEFAULT_TYPE) -> None:
+    await state_backend.evict()
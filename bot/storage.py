@@ -0,0 +1,116 @@
+import asyncio
+import hashlib
+import logging
+import os
+from pathlib import Path
+
+from sqlalchemy import select, update
+from sqlalchemy.exc import IntegrityError
+
+from database.db_setup import init_db, session_scope
+from database.models import Attendance, Proof
+
+logger = logging.getLogger(__name__)
+
+PROOFS_DIR = Path.cwd() / 'data' / 'proofs'
+INCOMING_DIR = PROOFS_DIR / 'incoming'
+
+
+def file_digest(path: Path) -> str:
+    digest = hashlib.sha256()
+
+    with open(path, 'rb') as file:
+        for chunk in iter(lambda: file.read(1024 * 1024), b''):
+            digest.update(chunk)
+
+    return digest.hexdigest()
+
+
+def shard_path(digest: str) -> Path:
+    return Path(digest[:2]) / digest[2:4] / f'{digest}.mp4'
+
+
+def place_file(source: Path, target: Path, keep_source: bool) -> None:
+    target.parent.mkdir(parents=True, exist_ok=True)
+
+    if target.exists():
+        if not keep_source:
+            source.unlink()
+    elif keep_source:
+        os.link(source, target)
+    else:
+        os.replace(source, target)
+
+
+async def get_or_create_proof(digest: str, size: int) -> int:
+    async with session_scope() as session:
+        proof_id = await session.scalar(select(Proof.id).filter_by(sha256=digest))
+
+    if proof_id is not None:
+        return proof_id
+
+    try:
+        async with session_scope() as session:
+            proof = Proof(sha256=digest, path=str(shard_path(digest)), size=size)
+            session.add(proof)
+    except IntegrityError:
+        async with session_scope() as session:
+            return await session.scalar(select(Proof.id).filter_by(sha256=digest))
+
+    return proof.id
+
+
+async def store(source: Path, keep_source: bool = False) -> int:
+    digest = await asyncio.to_thread(file_digest, source)
+    size = source.stat().st_size
+
+    await asyncio.to_thread(place_file, source, PROOFS_DIR / shard_path(digest), keep_source)
+
+    return await get_or_create_proof(digest, size)
+
+
+async def resolve(video_name: str) -> Path | None:
+    async with session_scope() as session:
+        path = await session.scalar(
+            select(Proof.path)
+            .join(Attendance, Attendance.proof_id == Proof.id)
+            .where(Attendance.video_path == video_name)
+        )
+
+    if path is not None:
+        return PROOFS_DIR / path
+
+    flat_path = PROOFS_DIR / Path(video_name).name
+
+    if flat_path.is_file():
+        return flat_path
+
+    return None
+
+
+async def migrate_flat_directory() -> None:
+    await init_db()
+    moved = 0
+
+    for flat_path in sorted(PROOFS_DIR.glob('*.mp4')):
+        proof_id = await store(flat_path, keep_source=True)
+
+        async with session_scope() as session:
+            await session.execute(
+                update(Attendance)
+                .where(Attendance.video_path == flat_path.name)
+                .values(proof_id=proof_id)
+            )
+
+        flat_path.unlink()
+        moved += 1
+
+    logger.info('Moved %s proofs into the sharded layout', moved)
+
+
+if __name__ == '__main__':
+    logging.basicConfig(
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        level=logging.INFO
+    )
+    asyncio.run(migrate_flat_directory())
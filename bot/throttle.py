@@ -0,0 +1,81 @@
+from functools import wraps
+from time import monotonic
+
+from telegram import Update
+from telegram.ext import ContextTypes
+
+from config import THROTTLE_BUDGETS
+
+
+class TokenBucket:
+    def __init__(self, capacity: int, refill: float) -> None:
+        self.capacity = capacity
+        self.refill = refill
+        self.allowed = 0
+        self.throttled = 0
+        self._arrivals: dict[int, float] = {}
+        self._notified: set[int] = set()
+
+    def __len__(self) -> int:
+        return len(self._arrivals)
+
+    def allow(self, user_id: int) -> bool:
+        now = monotonic()
+        arrival = max(self._arrivals.get(user_id, now), now)
+
+        if arrival - now > (self.capacity - 1) * self.refill:
+            self.throttled += 1
+            return False
+
+        self._arrivals[user_id] = arrival + self.refill
+        self._notified.discard(user_id)
+        self.allowed += 1
+        return True
+
+    def notify(self, user_id: int) -> bool:
+        if user_id in self._notified:
+            return False
+
+        self._notified.add(user_id)
+        return True
+
+    def prune(self) -> int:
+        now = monotonic()
+        idle = [user_id for user_id, arrival in self._arrivals.items() if arrival <= now]
+
+        for user_id in idle:
+            del self._arrivals[user_id]
+            self._notified.discard(user_id)
+
+        return len(idle)
+
+
+buckets = {group: TokenBucket(capacity, refill) for group, (capacity, refill) in THROTTLE_BUDGETS.items()}
+
+
+def throttled(group: str):
+    bucket = buckets[group]
+
+    def decorator(callback):
+        @wraps(callback)
+        async def wrapper(update: Update, context: ContextTypes.DEFAULT_TYPE):
+            user_id = update.effective_user.id
+
+            if bucket.allow(user_id):
+                return await callback(update, context)
+
+            if update.callback_query:
+                await update.callback_query.answer('⏳ Не так быстро!')
+            elif bucket.notify(user_id):
+                await update.effective_message.reply_text('⏳ Не так быстро, попробуй чуть позже')
+
+            return None
+
+        return wrapper
+
+    return decorator
+
+
+async def prune_buckets(context: ContextTypes.DEFAULT_TYPE) -> None:
+    for bucket in buckets.values():
+        bucket.prune()
@@ -0,0 +1,53 @@
+from datetime import date
+
+from sqlalchemy import select
+from telegram.ext import ContextTypes
+
+from database.db_setup import session_scope
+from database.models import DailyAttendance
+from database.rollup import lecture_bit
+from .schedule import schedule
+
+
+class TodayMarks:
+    def __init__(self) -> None:
+        self.day: date | None = None
+        self._masks: dict[int, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._masks)
+
+    def _roll_over(self) -> None:
+        today = schedule.now().date()
+
+        if self.day != today:
+            self.day = today
+            self._masks = {}
+
+    def has(self, user_id: int, lecture_number: int) -> bool:
+        self._roll_over()
+        return self._masks.get(user_id, 0) & lecture_bit(lecture_number) != 0
+
+    def add(self, user_id: int, day: date, lecture_number: int) -> None:
+        self._roll_over()
+
+        if day == self.day:
+            self._masks[user_id] = self._masks.get(user_id, 0) | lecture_bit(lecture_number)
+
+    async def seed(self) -> None:
+        day = schedule.now().date()
+
+        async with session_scope() as session:
+            rows = await session.execute(
+                select(DailyAttendance.user_id, DailyAttendance.lectures).where(DailyAttendance.date == day)
+            )
+
+        self.day = day
+        self._masks = dict(rows.all())
+
+
+today_marks = TodayMarks()
+
+
+async def roll_over_marks(context: ContextTypes.DEFAULT_TYPE) -> None:
+    await today_marks.seed()
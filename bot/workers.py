@@ -0,0 +1,106 @@
+import asyncio
+import json
+import logging
+import multiprocessing
+import signal
+from typing import Callable
+
+from telegram import Bot, Update
+from telegram.error import NetworkError
+from telegram.ext import Application
+
+from config import BOT_TOKEN
+from database.db_setup import init_db
+
+logger = logging.getLogger(__name__)
+
+
+def shard(update: Update, count: int) -> int:
+    if update.effective_user:
+        return update.effective_user.id % count
+
+    if update.effective_chat:
+        return update.effective_chat.id % count
+
+    return 0
+
+
+async def consume(application: Application, updates: multiprocessing.Queue) -> None:
+    await application.initialize()
+
+    if application.post_init:
+        await application.post_init(application)
+
+    await application.start()
+
+    try:
+        while (data := await asyncio.to_thread(updates.get)) is not None:
+            await application.update_queue.put(Update.de_json(json.loads(data), application.bot))
+    finally:
+        await application.stop()
+
+        if application.post_stop:
+            await application.post_stop(application)
+
+        await application.shutdown()
+
+        if application.post_shutdown:
+            await application.post_shutdown(application)
+
+
+def serve_shard(index: int, updates: multiprocessing.Queue, build: Callable[..., Application]) -> None:
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+
+    application = build(updater=False)
+    application.bot_data['worker'] = index
+
+    asyncio.run(consume(application, updates))
+
+
+async def dispatch(queues: list[multiprocessing.Queue]) -> None:
+    bot = Bot(BOT_TOKEN)
+    offset = None
+
+    async with bot:
+        await bot.delete_webhook(drop_pending_updates=True)
+
+        while True:
+            try:
+                updates = await bot.get_updates(offset=offset, timeout=30, allowed_updates=Update.ALL_TYPES)
+            except NetworkError as error:
+                logger.warning('Polling failed: %s', error)
+                await asyncio.sleep(1)
+                continue
+
+            for update in updates:
+                offset = update.update_id + 1
+                queues[shard(update, len(queues))].put(json.dumps(update.to_dict()))
+
+
+def run_workers(count: int, build: Callable[..., Application]) -> None:
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    asyncio.run(init_db())
+
+    context = multiprocessing.get_context('spawn')
+    queues = [context.Queue() for _ in range(count)]
+    workers = [
+        context.Process(target=serve_shard, args=(index, queue, build), name=f'bot-worker-{index}')
+        for index, queue in enumerate(queues)
+    ]
+
+    for worker in workers:
+        worker.start()
+
+    logger.info('Started %s bot workers', count)
+
+    try:
+        asyncio.run(dispatch(queues))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for queue in queues:
+            queue.put(None)
+
+        for worker in workers:
+            worker.join()
@@ -1,4 +1,4 @@
-from datetime import time
+from datetime import date, time
 from dotenv import load_dotenv
 from os import getenv
 
@@ -19,6 +19,15 @@ SHEDULE = [
     # (time(0, 0), time(23, 59)) # tests
 ]
 
+# Replaces SHEDULE for a weekday (0 - monday) or a specific date,
+# an empty list means no lectures that day
+SHEDULE_OVERRIDES = {
+    # 5: SHEDULE[:4],
+    # date(2024, 11, 4): []
+}
+
+TIME_ZONE = 'Asia/Vladivostok'
+
 CHALLENGES = [
     (
         'Помаши рукой 👋',
@@ -50,3 +59,39 @@ CHALLENGES = [
         'семинар'
     )
 ]
+
+USER_CACHE_SIZE = 1024
+USER_CACHE_TTL = 60 * 60
+
+CAPTCHA_POOL_SIZE = 32
+CAPTCHA_WORKERS = 2
+CAPTCHA_BATCH_SIZE = 8
+CAPTCHA_BACKEND = 'numpy'  # 'numpy' or 'pil'
+
+PROOF_WORKERS = 4
+PROOF_RETRIES = 3
+PROOF_RETRY_DELAY = 2
+
+EXPORT_BUNDLE = True  # send one attendance.zip instead of three files
+EXPORT_WORKERS = 2
+
+STATE_TTL = 5 * 60  # unfinished attendance flows expire after this many seconds
+STATE_MAX_SIZE = 4096
+STATE_EVICT_INTERVAL = 60
+STATE_BACKEND = 'memory'  # 'memory', 'sqlite' or 'redis' (pip install redis)
+STATE_FLUSH_INTERVAL = 5
+REDIS_URL = getenv('REDIS_URL', 'redis://localhost:6379/0')
+
+BOT_WORKERS = 1  # more than one needs a shared STATE_BACKEND; each worker gets 30/BOT_WORKERS requests/s
+
+CONCURRENT_UPDATES = 32  # updates handled at once; each user's updates stay in order
+
+BROADCAST_RATE = 25  # messages per second, below Telegram's global 30/s
+BROADCAST_BATCH_SIZE = 50  # recipients per checkpoint
+BROADCAST_RETRIES = 3
+BROADCAST_PROGRESS_INTERVAL = 5
+
+THROTTLE_BUDGETS = {  # per user: (burst, seconds to earn one more request)
+    'attendance': (3, 20),
+    'admin': (10, 2)
+}
@@ -0,0 +1,66 @@
+from collections import OrderedDict
+from time import monotonic
+
+from sqlalchemy import select
+
+from config import USER_CACHE_SIZE, USER_CACHE_TTL
+from .db_setup import session_scope
+from .models import User
+
+
+class UserCache:
+    def __init__(self, max_size: int, ttl: float) -> None:
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._users: OrderedDict[int, tuple[User, float]] = OrderedDict()
+
+    def get(self, telegram_id: int) -> User | None:
+        entry = self._users.get(telegram_id)
+
+        if entry is None or entry[1] < monotonic():
+            self._users.pop(telegram_id, None)
+            self.misses += 1
+            return None
+
+        self._users.move_to_end(telegram_id)
+        self.hits += 1
+        return entry[0]
+
+    def put(self, user: User) -> None:
+        self._users[user.telegram_id] = (user, monotonic() + self.ttl)
+        self._users.move_to_end(user.telegram_id)
+
+        if len(self._users) > self.max_size:
+            self._users.popitem(last=False)
+
+    def invalidate(self, telegram_id: int) -> None:
+        self._users.pop(telegram_id, None)
+
+    def stats(self) -> dict:
+        requests = self.hits + self.misses
+
+        return {
+            'size': len(self._users),
+            'max_size': self.max_size,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / requests if requests else 0.0
+        }
+
+
+user_cache = UserCache(USER_CACHE_SIZE, USER_CACHE_TTL)
+
+
+async def get_user(telegram_id: int) -> User | None:
+    user = user_cache.get(telegram_id)
+
+    if user is None:
+        async with session_scope() as session:
+            user = await session.scalar(select(User).filter_by(telegram_id=telegram_id))
+
+        if user:
+            user_cache.put(user)
+
+    return user
@@ -1,13 +1,54 @@
 import os
-from sqlalchemy import create_engine, and_, or_
-from sqlalchemy.orm import Session
+from contextlib import asynccontextmanager
+from sqlalchemy import and_, or_, create_engine, event
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from .migrations import migrate
 from .models import Base
 
 db_path = os.path.abspath(os.path.join(os.path.dirname(__file__), '../data/attendance.db'))
-engine = create_engine(f'sqlite:///{db_path}')
 
-Base.metadata.create_all(engine)
-session = Session(engine)
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'cache_size': -16000,
+    'mmap_size': 128 * 1024 * 1024,
+    'temp_store': 'MEMORY',
+    'busy_timeout': 5000
+}
+
+engine = create_async_engine(f'sqlite+aiosqlite:///{db_path}')
+sync_engine = create_engine(f'sqlite:///{db_path}')
+
+async_session = async_sessionmaker(engine, expire_on_commit=False)
+
+
+@event.listens_for(engine.sync_engine, 'connect')
+@event.listens_for(sync_engine, 'connect')
+def set_sqlite_pragmas(dbapi_connection, connection_record) -> None:
+    cursor = dbapi_connection.cursor()
+
+    for name, value in SQLITE_PRAGMAS.items():
+        cursor.execute(f'PRAGMA {name}={value}')
+
+    cursor.close()
+
+
+@asynccontextmanager
+async def session_scope():
+    async with async_session() as session:
+        try:
+            yield session
+            await session.commit()
+        except Exception:
+            await session.rollback()
+            raise
+
+
+async def init_db() -> None:
+    async with engine.begin() as connection:
+        await connection.run_sync(Base.metadata.create_all)
+        await connection.run_sync(migrate)
+
 
 and_ = and_
-or_ = or_
\ No newline at end of file
+or_ = or_
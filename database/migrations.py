@@ -0,0 +1,75 @@
+import logging
+from sqlalchemy import Connection, Index, inspect, text
+from .models import Base
+from .rollup import seed
+
+logger = logging.getLogger(__name__)
+
+ADDED_COLUMNS = [
+    ('attendance', 'date', 'DATE', 'substr(timestamp, 1, 10)'),
+    ('attendance', 'status', "VARCHAR(10) NOT NULL DEFAULT 'ready'", None),
+    ('attendance', 'proof_id', 'INTEGER REFERENCES proofs(id)', None),
+    ('attendance', 'file_id', 'VARCHAR(100)', None),
+    ('attendance', 'file_unique_id', 'VARCHAR(50)', None),
+]
+
+
+def add_columns(connection: Connection) -> None:
+    inspector = inspect(connection)
+
+    for table, column, column_type, backfill in ADDED_COLUMNS:
+        existing = {info['name'] for info in inspector.get_columns(table)}
+
+        if column in existing:
+            continue
+
+        connection.execute(text(f'ALTER TABLE {table} ADD COLUMN {column} {column_type}'))
+
+        if backfill:
+            connection.execute(text(f'UPDATE {table} SET {column} = {backfill}'))
+
+        logger.info('Added column %s.%s', table, column)
+
+
+def set_aside_duplicates(connection: Connection, index: Index) -> None:
+    table = index.table.name
+    key = ', '.join(column.name for column in index.columns)
+    duplicates = f'{table}_duplicates'
+    condition = f'id NOT IN (SELECT min(id) FROM {table} GROUP BY {key})'
+
+    connection.execute(text(f'CREATE TABLE IF NOT EXISTS {duplicates} AS SELECT * FROM {table} WHERE 0'))
+    result = connection.execute(text(f'INSERT INTO {duplicates} SELECT * FROM {table} WHERE {condition}'))
+
+    if not result.rowcount:
+        return
+
+    connection.execute(text(f'DELETE FROM {table} WHERE {condition}'))
+    logger.warning(
+        'Moved %s rows duplicating (%s) from %s to %s, their proofs are kept; '
+        'review them and drop the table when done',
+        result.rowcount, key, table, duplicates
+    )
+
+
+def create_indexes(connection: Connection) -> None:
+    existing = {
+        table.name: {index['name'] for index in inspect(connection).get_indexes(table.name)}
+        for table in Base.metadata.sorted_tables
+    }
+
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            if index.name in existing[table.name]:
+                continue
+
+            if index.unique:
+                set_aside_duplicates(connection, index)
+
+            index.create(connection)
+            logger.info('Created index %s', index.name)
+
+
+def migrate(connection: Connection) -> None:
+    add_columns(connection)
+    create_indexes(connection)
+    seed(connection)
@@ -1,4 +1,4 @@
-from sqlalchemy import String, ForeignKey
+from sqlalchemy import String, ForeignKey, Index
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
 import datetime
 
@@ -9,6 +9,10 @@ class Base(DeclarativeBase):
 
 class User(Base):
     __tablename__ = 'users'
+    __table_args__ = (
+        Index('ix_users_full_name', 'last_name', 'first_name', 'middle_name'),
+        Index('ix_users_subgroup', 'subgroup'),
+    )
     
     id: Mapped[int] = mapped_column(primary_key=True)
     telegram_id: Mapped[int] = mapped_column(unique=True, nullable=False)
@@ -20,15 +24,75 @@ class User(Base):
     attendances: Mapped['Attendance'] = relationship(order_by='Attendance.id', back_populates="user")
 
 
+class Proof(Base):
+    __tablename__ = 'proofs'
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    sha256: Mapped[str] = mapped_column(String(64), unique=True, nullable=False)
+    path: Mapped[str] = mapped_column(String(100), nullable=False)
+    size: Mapped[int] = mapped_column(nullable=False)
+
+
 class Attendance(Base):
     __tablename__ = 'attendance'
+    __table_args__ = (
+        Index('ix_attendance_timestamp_lecture', 'timestamp', 'lecture_number'),
+        Index('ix_attendance_user_timestamp', 'user_id', 'timestamp'),
+        Index('uq_attendance_user_date_lecture', 'user_id', 'date', 'lecture_number', unique=True),
+        Index('ix_attendance_video_path', 'video_path'),
+    )
     
     id: Mapped[int] = mapped_column(primary_key=True)
     timestamp: Mapped[datetime.datetime] = mapped_column(nullable=False) 
+    date: Mapped[datetime.date] = mapped_column(nullable=False)
     lecture_number: Mapped[int] = mapped_column(nullable=False)
     user_id = mapped_column(ForeignKey("users.id"))
+    proof_id = mapped_column(ForeignKey("proofs.id"), nullable=True)
     
     challenge: Mapped[str] = mapped_column(String(50), nullable=False)
     video_path: Mapped[str] = mapped_column(String(50), nullable=False)
+    status: Mapped[str] = mapped_column(String(10), default='ready', server_default='ready', nullable=False)
+    file_id: Mapped[str | None] = mapped_column(String(100))
+    file_unique_id: Mapped[str | None] = mapped_column(String(50))
     
     user: Mapped[User] = relationship(back_populates="attendances")
+
+
+class DailyAttendance(Base):
+    __tablename__ = 'daily_attendance'
+    __table_args__ = (
+        Index('ix_daily_attendance_date', 'date'),
+    )
+
+    user_id = mapped_column(ForeignKey("users.id"), primary_key=True)
+    date: Mapped[datetime.date] = mapped_column(primary_key=True)
+    lectures: Mapped[int] = mapped_column(default=0, nullable=False)
+
+
+class StateEntry(Base):
+    __tablename__ = 'state'
+    __table_args__ = (
+        Index('ix_state_expires', 'expires'),
+    )
+
+    key: Mapped[str] = mapped_column(String(100), primary_key=True)
+    value: Mapped[str] = mapped_column(nullable=False)
+    expires: Mapped[float | None] = mapped_column()
+
+
+class Broadcast(Base):
+    __tablename__ = 'broadcasts'
+    __table_args__ = (
+        Index('ix_broadcasts_status', 'status'),
+    )
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    chat_id: Mapped[int] = mapped_column(nullable=False)
+    message_id: Mapped[int] = mapped_column(nullable=False)
+    progress_message_id: Mapped[int] = mapped_column(nullable=False)
+    subgroup: Mapped[int | None] = mapped_column()
+    total: Mapped[int] = mapped_column(default=0, nullable=False)
+    sent: Mapped[int] = mapped_column(default=0, nullable=False)
+    failed: Mapped[int] = mapped_column(default=0, nullable=False)
+    last_user_id: Mapped[int] = mapped_column(default=0, nullable=False)
+    status: Mapped[str] = mapped_column(String(10), default='running', nullable=False)
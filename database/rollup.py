@@ -0,0 +1,59 @@
+import asyncio
+import logging
+from sqlalchemy import Connection, Insert, func, select, text
+from sqlalchemy.dialects.sqlite import insert
+from .models import Attendance, DailyAttendance
+
+logger = logging.getLogger(__name__)
+
+
+def lecture_bit(lecture_number: int) -> int:
+    return 1 << (lecture_number - 1)
+
+
+def upsert_statement() -> Insert:
+    statement = insert(DailyAttendance)
+
+    return statement.on_conflict_do_update(
+        index_elements=[DailyAttendance.user_id, DailyAttendance.date],
+        set_={'lectures': DailyAttendance.lectures.op('|')(statement.excluded.lectures)}
+    )
+
+
+def rollup_params(user_id: int, day, lecture_number: int) -> dict:
+    return {'user_id': user_id, 'date': day, 'lectures': lecture_bit(lecture_number)}
+
+
+def rebuild(connection: Connection) -> None:
+    connection.execute(text('DELETE FROM daily_attendance'))
+    result = connection.execute(text(
+        'INSERT INTO daily_attendance (user_id, date, lectures) '
+        'SELECT user_id, date, SUM(1 << (lecture_number - 1)) FROM attendance '
+        'WHERE user_id IS NOT NULL GROUP BY user_id, date'
+    ))
+
+    logger.info('Rebuilt daily attendance rollup: %s rows', result.rowcount)
+
+
+def seed(connection: Connection) -> None:
+    empty = connection.scalar(select(func.count()).select_from(DailyAttendance)) == 0
+
+    if empty and connection.scalar(select(Attendance.id).limit(1)) is not None:
+        rebuild(connection)
+
+
+async def main() -> None:
+    from .db_setup import engine, init_db
+
+    await init_db()
+
+    async with engine.begin() as connection:
+        await connection.run_sync(rebuild)
+
+
+if __name__ == '__main__':
+    logging.basicConfig(
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        level=logging.INFO
+    )
+    asyncio.run(main())
@@ -0,0 +1,59 @@
+import asyncio
+
+from telegram import Update
+
+from bot.concurrency import UserOrderedUpdateProcessor
+
+
+def make_update(update_id: int, user_id: int) -> Update:
+    return Update.de_json({
+        'update_id': update_id,
+        'message': {
+            'message_id': update_id,
+            'date': 0,
+            'chat': {'id': user_id, 'type': 'private'},
+            'from': {'id': user_id, 'is_bot': False, 'first_name': 'Test'},
+            'text': 'test'
+        }
+    }, None)
+
+
+def test_user_order_without_head_of_line_blocking():
+    async def scenario():
+        processor = UserOrderedUpdateProcessor(4)
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        order, finished = [], {}
+        running = peak = 0
+
+        async def handle(update_id: int, user_id: int, delay: float):
+            nonlocal running, peak
+            running += 1
+            peak = max(peak, running)
+            order.append((user_id, update_id))
+
+            await asyncio.sleep(delay)
+
+            finished[user_id, update_id] = loop.time() - started
+            running -= 1
+
+        tasks = [asyncio.create_task(processor.process_update(make_update(0, 1), handle(0, 1, 0.5)))]
+        tasks += [
+            asyncio.create_task(processor.process_update(make_update(update_id, 1), handle(update_id, 1, 0)))
+            for update_id in range(1, 6)
+        ]
+        await asyncio.sleep(0)
+
+        tasks.append(asyncio.create_task(processor.process_update(make_update(10, 2), handle(10, 2, 0))))
+        tasks += [
+            asyncio.create_task(processor.process_update(make_update(20 + user_id, user_id), handle(20 + user_id, user_id, 0.1)))
+            for user_id in range(100, 110)
+        ]
+        await asyncio.gather(*tasks)
+
+        assert [update_id for user_id, update_id in order if user_id == 1] == [0, 1, 2, 3, 4, 5]
+        assert finished[2, 10] < 0.25
+        assert peak == 4
+        assert processor.active_users == 0
+
+    asyncio.run(scenario())
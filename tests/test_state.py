@@ -0,0 +1,145 @@
+import asyncio
+from contextlib import asynccontextmanager
+
+import pytest
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from bot import state
+from bot.persistence import BackendPersistence
+from database.models import StateEntry
+
+
+@pytest.fixture(params=['memory', 'sqlite', 'redis'])
+def run(request, tmp_path, monkeypatch):
+    if request.param == 'redis':
+        fakeredis = pytest.importorskip('fakeredis')
+        monkeypatch.setattr('redis.asyncio.Redis', fakeredis.FakeAsyncRedis)
+
+    async def create_backend():
+        if request.param == 'memory':
+            return state.MemoryBackend(), None
+
+        if request.param == 'redis':
+            backend = state.RedisBackend('redis://localhost:6379/0')
+            await backend.redis.flushall()
+            return backend, None
+
+        engine = create_async_engine(f'sqlite+aiosqlite:///{tmp_path / "state.db"}')
+        sessions = async_sessionmaker(engine, expire_on_commit=False)
+
+        async with engine.begin() as connection:
+            await connection.run_sync(StateEntry.__table__.create)
+
+        @asynccontextmanager
+        async def session_scope():
+            async with sessions() as session, session.begin():
+                yield session
+
+        monkeypatch.setattr(state, 'session_scope', session_scope)
+        return state.SqliteBackend(), engine
+
+    def run(scenario):
+        async def main():
+            backend, engine = await create_backend()
+
+            try:
+                await scenario(backend)
+            finally:
+                await backend.close()
+
+                if engine is not None:
+                    await engine.dispose()
+
+        asyncio.run(main())
+
+    return run
+
+
+def test_set_get_pop(run):
+    async def scenario(backend):
+        assert await backend.get('key') is None
+
+        await backend.set('key', 'first')
+        await backend.set('key', 'second')
+        assert await backend.get('key') == 'second'
+
+        assert await backend.pop('key') == 'second'
+        assert await backend.get('key') is None
+        assert await backend.pop('key') is None
+
+    run(scenario)
+
+
+def test_scan_and_count(run):
+    async def scenario(backend):
+        await backend.set('user_data:1', 'a')
+        await backend.set('user_data:2', 'b')
+        await backend.set('userXdata:3', 'c')
+        await backend.set('conversation:ping:[1, 1]', 'd')
+
+        assert sorted(await backend.scan('user_data:')) == [('user_data:1', 'a'), ('user_data:2', 'b')]
+        assert await backend.count('user_data:') == 2
+        assert await backend.count('conversation:ping:') == 1
+        assert await backend.scan('missing:') == []
+
+    run(scenario)
+
+
+def test_ttl_expiry(run):
+    async def scenario(backend):
+        await backend.set('ttl:short', 'a', ttl=0.05)
+        await backend.set('ttl:long', 'b', ttl=60)
+        await backend.set('ttl:forever', 'c')
+
+        await asyncio.sleep(0.2)
+        await backend.evict()
+
+        assert await backend.get('ttl:short') is None
+        assert await backend.pop('ttl:short') is None
+        assert await backend.get('ttl:long') == 'b'
+        assert sorted(await backend.scan('ttl:')) == [('ttl:forever', 'c'), ('ttl:long', 'b')]
+        assert await backend.count('ttl:') == 2
+
+    run(scenario)
+
+
+def test_state_store(run):
+    async def scenario(backend):
+        store = state.StateStore(backend, 'captcha', 60)
+        await store.put(1, 2, 3, 'ABC', cleanup=[4], lecture=5)
+
+        assert await store.count() == 1
+
+        captcha = await store.pop(1)
+        assert (captcha.chat_id, captcha.message_id, captcha.text, captcha.cleanup, captcha.lecture) == (2, 3, 'ABC', [4], 5)
+        assert await store.pop(1) is None
+
+        short = state.StateStore(backend, 'challenge', 0.2)
+        await short.put(1, 2, 3, 'ABC')
+        await asyncio.sleep(0.25)
+
+        assert await short.pop(1) is None
+        assert short.expired == 1
+
+    run(scenario)
+
+
+def test_persistence_round_trip(run):
+    async def scenario(backend):
+        persistence = BackendPersistence(backend, update_interval=60)
+
+        await persistence.update_conversation('attendance', (5, 5), 1)
+        await persistence.update_conversation('attendance', (6, 6), 0)
+        await persistence.update_conversation('ping', (5, 5), 2)
+        await persistence.update_conversation('attendance', (6, 6), None)
+
+        assert await persistence.get_conversations('attendance') == {(5, 5): 1}
+        assert await persistence.get_conversations('ping') == {(5, 5): 2}
+
+        await persistence.update_user_data(5, {'manual_mark': {'users': ['Иванов Иван Иванович']}})
+        assert await persistence.get_user_data() == {5: {'manual_mark': {'users': ['Иванов Иван Иванович']}}}
+
+        await persistence.drop_user_data(5)
+        assert await persistence.get_user_data() == {}
+
+    run(scenario)